@@ -0,0 +1,85 @@
+"""
+
+Benchmark the persistent embedding cache on a re-run where only a share of the texts changed (--changed): reports how
+many texts would be re-encoded and the seconds per run (random vectors stand in for the models), and checks the cached
+vectors of unchanged texts come back unchanged.
+
+    python benchmarks/bench_embedding_cache.py --n_texts 100000 --changed 0.05
+
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+import numpy as np
+
+from ddcuimap.semantic_search.utils.embedding_cache import (
+    DenseEmbeddingCache,
+    SparseEmbeddingCache,
+)
+
+from bench_pinecone_local import random_dense, random_sparse
+
+
+def embed_run(dense_cache, sparse_cache, texts, rng, dimension, nnz):
+    """Stands in for hybrid_builder: encodes (random vectors) only the texts missing from the caches"""
+
+    start = time.perf_counter()
+    missing = dense_cache.missing(texts)
+    dense_cache.put(missing, random_dense(rng, len(missing), dimension))
+    sparse_cache.put(sparse_cache.missing(texts), random_sparse(rng, len(missing), nnz))
+    dense_vecs = dense_cache.get(texts)
+    sparse_vecs = sparse_cache.get(texts)
+    return len(missing), time.perf_counter() - start, dense_vecs, sparse_vecs
+
+
+def run_benchmark(args) -> bool:
+    rng = np.random.default_rng(args.seed)
+    texts = [f"variable {i} definition text" for i in range(args.n_texts)]
+    changed = rng.choice(args.n_texts, int(args.changed * args.n_texts), replace=False)
+    texts_rerun = list(texts)
+    for i in changed:
+        texts_rerun[i] = f"{texts[i]} (revised)"
+    print(f"{'run':>6} {'encoded':>8} {'run s':>8}")
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        caches = [
+            DenseEmbeddingCache(dir_tmp, "dense-model", True),
+            SparseEmbeddingCache(dir_tmp, "sparse-model", True),
+        ]
+        n_encoded, seconds, dense_first, sparse_first = embed_run(
+            *caches, texts, rng, args.dimension, args.nnz
+        )
+        print(f"{'first':>6} {n_encoded:>8} {seconds:>8.2f}")
+        caches = [  # reopened as a new process would
+            DenseEmbeddingCache(dir_tmp, "dense-model", True),
+            SparseEmbeddingCache(dir_tmp, "sparse-model", True),
+        ]
+        n_encoded, seconds, dense_rerun, sparse_rerun = embed_run(
+            *caches, texts_rerun, rng, args.dimension, args.nnz
+        )
+        print(f"{'rerun':>6} {n_encoded:>8} {seconds:>8.2f}")
+    unchanged = np.setdiff1d(np.arange(args.n_texts), changed)
+    return (
+        n_encoded == len(changed)
+        and np.array_equal(dense_first[unchanged], dense_rerun[unchanged])
+        and all(sparse_first[i] == sparse_rerun[i] for i in unchanged)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark embedding cache")
+    parser.add_argument("--n_texts", type=int, default=100000)
+    parser.add_argument("--changed", type=float, default=0.05)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument(
+        "--nnz", type=int, default=40, help="SPLADE nonzeros per vector"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    raise SystemExit(0 if run_benchmark(args) else 1)
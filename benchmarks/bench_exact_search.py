@@ -0,0 +1,135 @@
+"""
+
+Benchmark the exact memory-mapped hybrid backend against per-query search on the local Pinecone stand-in, checking
+both return the same matches for every alpha. --rtt models the network round-trip of a hosted index.
+
+    python benchmarks/bench_exact_search.py --n_vectors 100000 --n_queries 1000 --alpha 1.0 0.5 0.0
+
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+import numpy as np
+import pandas as pd
+
+import ddcuimap.utils.helper as helper
+from ddcuimap.semantic_search.utils import runners as run
+from ddcuimap.semantic_search.utils.exact_search import ExactHybridStore
+from ddcuimap.semantic_search.utils.local_pinecone import LocalPinecone
+
+from bench_pinecone_local import build_query_embeddings, random_dense, random_sparse
+
+
+def build_umls_embeddings(rng, n_vectors: int, nnz: int, cfg) -> pd.DataFrame:
+    """Synthetic embed_umls output with the columns step3_upsert_umls_subset reads"""
+
+    index_cfg = cfg.semantic_search.pinecone.index
+    df = pd.DataFrame({"vector_id": [str(i) for i in range(n_vectors)]})
+    df["CUI"] = [f"C{i:07d}" for i in range(n_vectors)]
+    df["STR"] = [f"term {i}" for i in range(n_vectors)]
+    for col in cfg.semantic_search.upsert.embed_columns:
+        df[f"{col}_dense_vecs"] = list(
+            random_dense(rng, n_vectors, index_cfg.dimension)
+        )
+        df[f"{col}_sparse_vecs_upsert"] = random_sparse(rng, n_vectors, nnz)
+    return df
+
+
+def match_ids(var_results) -> list:
+    return [
+        [m.id for m in response.matches]
+        for search_IDs in var_results.values()
+        for results in search_IDs.values()
+        for response in results.values()
+    ]
+
+
+def run_benchmark(args) -> bool:
+    cfg = helper.compose_config(
+        overrides=[
+            "custom=title_def",
+            "apis=config_pinecone_api",
+            "semantic_search=embeddings",
+        ]
+    )
+    index_cfg = cfg.semantic_search.pinecone.index
+    rng = np.random.default_rng(args.seed)
+    df_umls_embeddings = build_umls_embeddings(rng, args.n_vectors, args.nnz, cfg)
+    df_query_embeddings = build_query_embeddings(rng, args.n_queries, cfg)
+    n_calls = args.n_queries * len(cfg.semantic_search.query.queries.hybrid)
+    ok = True
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        start = time.perf_counter()
+        exact_index = ExactHybridStore(dir_tmp, args.query_batch_size).build_index(
+            index_cfg.index_name,
+            df_umls_embeddings,
+            cfg.semantic_search.upsert.embed_columns,
+            ["CUI", "STR"],
+            index_cfg.dimension,
+            index_cfg.metric,
+        )
+        print(f"built exact index in {time.perf_counter() - start:.2f} s")
+        pinecone = LocalPinecone(dirpath=dir_tmp)
+        pinecone.create_index(index_cfg.index_name, index_cfg.dimension, "dotproduct")
+        local_index = pinecone.Index(index_cfg.index_name)
+        for namespace in index_cfg.namespaces:
+            local_index.upsert(
+                vectors=[
+                    {
+                        "id": row.vector_id,
+                        "values": getattr(row, f"{namespace}_dense_vecs"),
+                        "sparse_values": getattr(
+                            row, f"{namespace}_sparse_vecs_upsert"
+                        ),
+                    }
+                    for row in df_umls_embeddings.itertuples()
+                ],
+                namespace=namespace,
+            )
+        print(
+            f"{'alpha':>6} {'exact q/s':>10} {'local q/s':>10} {f'rtt={args.rtt} q/s':>12} {'same':>5}"
+        )
+        for alpha in args.alpha:
+            start = time.perf_counter()
+            exact_results = run.hybrid_search_runner(
+                exact_index, df_query_embeddings, alpha, cfg
+            )
+            exact_per_second = n_calls / (time.perf_counter() - start)
+            start = time.perf_counter()
+            local_results = run.hybrid_search_runner(
+                local_index, df_query_embeddings, alpha, cfg
+            )
+            local_seconds = time.perf_counter() - start
+            local_per_second = n_calls / local_seconds
+            network_per_second = n_calls / (local_seconds + n_calls * args.rtt)
+            same = match_ids(exact_results) == match_ids(local_results)
+            ok = ok and same
+            print(
+                f"{alpha:>6} {exact_per_second:>10.0f} {local_per_second:>10.1f} "
+                f"{network_per_second:>12.1f} {str(same):>5}"
+            )
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark exact hybrid backend")
+    parser.add_argument("--n_vectors", type=int, default=100000)
+    parser.add_argument("--n_queries", type=int, default=1000)
+    parser.add_argument(
+        "--nnz", type=int, default=40, help="SPLADE nonzeros per vector"
+    )
+    parser.add_argument("--alpha", nargs="+", type=float, default=[1.0, 0.5, 0.0])
+    parser.add_argument("--query_batch_size", type=int, default=256)
+    parser.add_argument(
+        "--rtt", type=float, default=0.05, help="modelled seconds per hosted query"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    raise SystemExit(0 if run_benchmark(args) else 1)
@@ -0,0 +1,173 @@
+"""
+
+Report the recall@k / latency trade-off of the HNSW backend against exact brute-force search per ef_search at each
+alpha (and per hybrid_candidates for hybrid queries), then time hybrid_search_runner at each alpha. Uses saved embeddings if given (df_umls_embeddings.pkl
+from step2_embed_umls_subset and df_query_embeddings_raw.pkl from the query pipeline), otherwise synthetic clustered
+vectors. Requires hnswlib.
+
+    python benchmarks/bench_hnsw_search.py --n_vectors 100000 --n_queries 1000 --ef_search 20 50 100 200
+    python benchmarks/bench_hnsw_search.py --fp_embeddings df_umls_embeddings.pkl --fp_query_embeddings df_query_embeddings_raw.pkl
+
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+import numpy as np
+import pandas as pd
+
+import ddcuimap.utils.helper as helper
+from ddcuimap.semantic_search.utils import runners as run
+from ddcuimap.semantic_search.utils.exact_search import ExactHybridIndex
+from ddcuimap.semantic_search.utils.hnsw_search import HNSWHybridStore
+
+from bench_exact_search import match_ids
+from bench_pinecone_local import random_sparse
+
+
+def random_clustered(rng, n: int, dimension: int, n_clusters: int = 500):
+    """Unit vectors around random centroids, closer to real sentence embeddings than isotropic noise"""
+
+    centroids = rng.standard_normal((n_clusters, dimension)).astype(np.float32)
+    vecs = centroids[rng.integers(n_clusters, size=n)]
+    vecs += 0.6 * rng.standard_normal((n, dimension)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def build_embeddings(rng, args, cfg):
+    """Synthetic embed_umls output and query embeddings with the columns the runners read"""
+
+    dimension = cfg.semantic_search.pinecone.index.dimension
+    vecs = random_clustered(rng, args.n_vectors + args.n_queries, dimension)
+    df_umls = pd.DataFrame({"vector_id": [str(i) for i in range(args.n_vectors)]})
+    df_umls["CUI"] = [f"C{i:07d}" for i in range(args.n_vectors)]
+    df_query = pd.DataFrame(
+        {
+            cfg.custom.data_dictionary_settings.variable_column: [
+                f"Var{i}" for i in range(args.n_queries)
+            ],
+            "search_ID": range(1, args.n_queries + 1),
+        }
+    )
+    for col in cfg.semantic_search.upsert.embed_columns:
+        rng.shuffle(vecs)
+        df_umls[f"{col}_dense_vecs"] = list(vecs[: args.n_vectors])
+        df_umls[f"{col}_sparse_vecs_upsert"] = random_sparse(rng, args.n_vectors, 40)
+    for col_prefix, _ in cfg.semantic_search.query.queries.hybrid.values():
+        df_query[f"{col_prefix}_dense_vecs"] = list(vecs[args.n_vectors :])
+        df_query[f"{col_prefix}_sparse_vecs_upsert"] = random_sparse(
+            rng, args.n_queries, 10
+        )
+    return df_umls, df_query
+
+
+def run_benchmark(args):
+    cfg = helper.compose_config(
+        overrides=[
+            "custom=title_def",
+            "apis=config_pinecone_api",
+            "semantic_search=embeddings",
+        ]
+    )
+    index_cfg = cfg.semantic_search.pinecone.index
+    if args.fp_embeddings:
+        df_umls = pd.read_pickle(args.fp_embeddings)
+        df_query = pd.read_pickle(args.fp_query_embeddings)
+    else:
+        df_umls, df_query = build_embeddings(
+            np.random.default_rng(args.seed), args, cfg
+        )
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        store = HNSWHybridStore(
+            dir_tmp,
+            M=args.M,
+            ef_construction=args.ef_construction,
+            hybrid_candidates=args.hybrid_candidates[0],
+        )
+        start = time.perf_counter()
+        index = store.build_index(
+            index_cfg.index_name,
+            df_umls,
+            cfg.semantic_search.upsert.embed_columns,
+            ["CUI"],
+            index_cfg.dimension,
+            index_cfg.metric,
+        )
+        print(
+            f"built exact files and HNSW graphs in {time.perf_counter() - start:.1f} s"
+        )
+        exact_index = ExactHybridIndex(index.dirpath)
+        ls_recall = []
+        for alpha in args.alpha:
+            for hybrid_candidates in args.hybrid_candidates if alpha < 1 else [None]:
+                index.hybrid_candidates = hybrid_candidates or index.hybrid_candidates
+                for (
+                    col_prefix,
+                    namespace,
+                ) in cfg.semantic_search.query.queries.hybrid.values():
+                    ls_recall.append(
+                        index.recall_at_k(
+                            namespace,
+                            np.asarray(df_query[f"{col_prefix}_dense_vecs"].tolist()),
+                            cfg.semantic_search.query.top_k,
+                            args.ef_search,
+                            df_query[f"{col_prefix}_sparse_vecs_upsert"].tolist(),
+                            alpha,
+                        )
+                    )
+        index.hybrid_candidates = args.hybrid_candidates[0]
+        print(pd.concat(ls_recall).to_string(index=False, float_format="%.3f"))
+        print(
+            f"\n{'alpha':>6} {'ef_search':>9} {'overlap@k':>9} {'hnsw q/s':>9} {'exact q/s':>9}"
+        )
+        n_calls = len(df_query) * len(cfg.semantic_search.query.queries.hybrid)
+        for alpha in args.alpha:
+            start = time.perf_counter()
+            exact_ids = match_ids(
+                run.hybrid_search_runner(exact_index, df_query, alpha, cfg)
+            )
+            exact_per_second = n_calls / (time.perf_counter() - start)
+            for ef in args.ef_search:
+                index.ef_search = ef
+                start = time.perf_counter()
+                hnsw_ids = match_ids(
+                    run.hybrid_search_runner(index, df_query, alpha, cfg)
+                )
+                hnsw_per_second = n_calls / (time.perf_counter() - start)
+                overlap = np.mean(
+                    [
+                        len(set(a).intersection(b)) / max(len(b), 1)
+                        for a, b in zip(hnsw_ids, exact_ids)
+                    ]
+                )
+                print(
+                    f"{alpha:>6} {ef:>9} {overlap:>9.3f} {hnsw_per_second:>9.0f} {exact_per_second:>9.0f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark HNSW recall/latency")
+    parser.add_argument("--fp_embeddings", help="df_umls_embeddings.pkl")
+    parser.add_argument("--fp_query_embeddings", help="df_query_embeddings_raw.pkl")
+    parser.add_argument("--n_vectors", type=int, default=100000)
+    parser.add_argument("--n_queries", type=int, default=1000)
+    parser.add_argument("--M", type=int, default=16)
+    parser.add_argument("--ef_construction", type=int, default=200)
+    parser.add_argument("--ef_search", nargs="+", type=int, default=[20, 50, 100, 200])
+    parser.add_argument("--alpha", nargs="+", type=float, default=[1.0, 0.5])
+    parser.add_argument(
+        "--hybrid_candidates",
+        nargs="+",
+        type=int,
+        default=[100, 400],
+        help="dense neighbours re-scored per hybrid query (the first is used for the runner timings)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    run_benchmark(args)
@@ -0,0 +1,84 @@
+"""
+
+Benchmark the MetaMap batch path end to end (CAS tickets, chunked SKR submission, streaming and parsing) against
+the local SKR/CAS stand-in server (no network or UMLS account needed).
+
+    python benchmarks/bench_mm_batch_local.py --n_lines 5000 --chunk_sizes 5000 1000 250 --max_workers 1 4 8
+    python benchmarks/bench_mm_batch_local.py --output_formats JSONf
+
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+import ddcuimap.utils.helper as helper
+from ddcuimap.metamap.skr_web_api import casauth
+from ddcuimap.metamap.skr_web_api.local_server import LocalSKRServer
+from ddcuimap.metamap.utils import metamap_query_processing_functions as mm_qproc
+
+
+def run_benchmark(args):
+    cfg = helper.compose_config(overrides=["custom=de", "apis=config_metamap_api"])
+    api_settings = cfg.apis.metamap.api_settings
+    cfg.apis.metamap.user_info.apiKey = "local"
+    cfg.apis.metamap.user_info.email = "local@example.com"
+    api_settings.cache.enabled = False
+    with tempfile.TemporaryDirectory() as dir_tmp, LocalSKRServer(
+        port=0,
+        latency=args.latency,
+        latency_per_line=args.latency_per_line,
+        max_candidates=args.max_candidates,
+        max_jobs=args.max_jobs,
+    ) as server:
+        casauth.TGT_CACHE_FILEPATH = Path(dir_tmp) / "cas_tgt.json"
+        api_settings.casserverurl = server.casserverurl
+        api_settings.serviceurl = server.serviceurl
+        fp_mm_inputfile = Path(dir_tmp) / "metamap-search_inputfile_SingLinePMID.txt"
+        fp_mm_inputfile.write_text(
+            "".join(
+                f"Var{i}_{i}|systolic blood pressure measurement {i % 97}\n"
+                for i in range(1, args.n_lines + 1)
+            )
+        )
+        print(
+            f"{'format':>6} {'chunk_size':>10} {'workers':>8} {'seconds':>8} {'rows':>8} {'TGTs':>5} {'jobs':>5}"
+        )
+        for output_format in args.output_formats:
+            api_settings.output_format = output_format
+            for chunk_size in args.chunk_sizes:
+                for max_workers in args.max_workers:
+                    api_settings.batch.chunk_size = chunk_size
+                    api_settings.batch.max_workers = max_workers
+                    counts = dict(server.counts)
+                    start = time.perf_counter()
+                    df_results = mm_qproc.run_cached_batch_metamap_api(
+                        fp_mm_inputfile, cfg, dir_tmp
+                    )
+                    elapsed = time.perf_counter() - start
+                    print(
+                        f"{output_format:>6} {chunk_size:>10} {max_workers:>8} {elapsed:>8.2f} {len(df_results):>8} "
+                        f"{server.counts['tgt'] - counts['tgt']:>5} {server.counts['batch'] - counts['batch']:>5}"
+                    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark MetaMap batch path")
+    parser.add_argument("--n_lines", type=int, default=5000)
+    parser.add_argument("--chunk_sizes", nargs="+", type=int, default=[5000, 1000, 250])
+    parser.add_argument("--max_workers", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument(
+        "--output_formats", nargs="+", default=["JSONn", "JSONf", "MMI"]
+    )
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--latency_per_line", type=float, default=0.001)
+    parser.add_argument("--max_candidates", type=int, default=5)
+    parser.add_argument("--max_jobs", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    run_benchmark(args)
@@ -0,0 +1,130 @@
+"""
+
+Benchmark MetaMap json to dataframe conversion: legacy per-document json_normalize vs. columnar extraction.
+
+Uses a saved MetaMap json output (e.g. a metamap-search_chunks/*_output.json chunk file) if given, otherwise a
+synthetic output with --n_docs documents.
+
+    python benchmarks/bench_mm_json_to_df.py --fp_json path/to/metamap-search_chunks/..._chunk-0001_output.json
+    python benchmarks/bench_mm_json_to_df.py --n_docs 20000
+
+"""
+
+import argparse
+import json
+import logging
+import random
+import time
+
+import pandas as pd
+
+import ddcuimap.utils.helper as helper
+from ddcuimap.metamap.utils import metamap_query_processing_functions as mm_qproc
+
+
+def legacy_process_mm_json_to_df(mm_json, cfg) -> pd.DataFrame:
+    """Previous implementation: one json_normalize frame per document (first utterance only), then concat"""
+
+    ls_df_maps = []
+    for doc in mm_json["AllDocuments"]:
+        pmid = doc["Document"]["Utterances"][0]["PMID"]
+        search_ID = int(pmid.split("_")[-1])
+        df_temp = pd.json_normalize(
+            doc["Document"]["Utterances"][0]["Phrases"],
+            record_path=["Candidates"],
+            errors="ignore",
+        )
+        if df_temp.empty:
+            df_temp = pd.DataFrame(columns=cfg.apis.metamap.output_settings.columns)
+        df_temp.insert(0, "PMID", pmid)
+        df_temp.insert(1, "search_ID", search_ID)
+        df_temp.insert(2, "recCount", len(df_temp))
+        df_temp.insert(
+            3, "overall_rank", mm_qproc.rank_CandidateScore(df_temp["CandidateScore"])
+        )
+        ls_df_maps.append(df_temp)
+    return pd.concat(ls_df_maps)
+
+
+def build_mm_json(n_docs: int, seed: int = 0) -> dict:
+    """Synthetic MetaMap JSON output with 0-10 candidates per document"""
+
+    rng = random.Random(seed)
+
+    def candidate():
+        return {
+            "CandidateScore": str(-rng.choice([1000, 966, 913, 861, 827, 790])),
+            "CandidateCUI": f"C{rng.randrange(10**7):07d}",
+            "CandidateMatched": "blood pressure",
+            "CandidatePreferred": "Blood Pressure",
+            "MatchedWords": ["blood", "pressure"],
+            "SemTypes": ["ortf"],
+            "MatchMaps": [
+                {
+                    "TextMatchStart": "1",
+                    "TextMatchEnd": "2",
+                    "ConcMatchStart": "1",
+                    "ConcMatchEnd": "2",
+                    "LexVariation": "0",
+                }
+            ],
+            "IsHead": "yes",
+            "IsOverMatch": "no",
+            "Sources": ["NCI", "MSH"],
+            "ConceptPIs": [{"StartPos": "0", "Length": "14"}],
+            "Status": "0",
+            "Negated": "0",
+        }
+
+    return {
+        "AllDocuments": [
+            {
+                "Document": {
+                    "Utterances": [
+                        {
+                            "PMID": f"Var{i}_{i}",
+                            "Phrases": [
+                                {
+                                    "Candidates": [
+                                        candidate() for _ in range(rng.randint(0, 5))
+                                    ]
+                                }
+                                for _ in range(2)
+                            ],
+                        }
+                    ]
+                }
+            }
+            for i in range(1, n_docs + 1)
+        ]
+    }
+
+
+def run_benchmark(mm_json):
+    cfg = helper.compose_config(overrides=["custom=de", "apis=config_metamap_api"])
+    timings = {}
+    for name, func in [
+        ("legacy json_normalize", legacy_process_mm_json_to_df),
+        ("columnar", mm_qproc.process_mm_json_to_df),
+    ]:
+        start = time.perf_counter()
+        df = func(mm_json, cfg)
+        timings[name] = time.perf_counter() - start
+        print(f"{name:>22}: {timings[name]:8.2f} s ({len(df)} rows)")
+    print(
+        f"{'speedup':>22}: {timings['legacy json_normalize'] / timings['columnar']:8.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark process_mm_json_to_df")
+    parser.add_argument("--fp_json", help="saved MetaMap json output")
+    parser.add_argument("--n_docs", type=int, default=20000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    if args.fp_json:
+        with open(args.fp_json) as f:
+            mm_json = json.load(f)
+    else:
+        mm_json = build_mm_json(args.n_docs)
+    run_benchmark(mm_json)
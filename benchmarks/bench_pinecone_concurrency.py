@@ -0,0 +1,109 @@
+"""
+
+Benchmark concurrent hybrid_search_runner queries against the local Pinecone stand-in with a modelled per-query
+round-trip (--latency) and a share of throttled 429 responses (--throttle_rate), checking every max_workers setting
+returns the same matches, in the same order, as sequential querying.
+
+    python benchmarks/bench_pinecone_concurrency.py --n_queries 500 --latency 0.05 --max_workers 1 4 8 16
+
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+import numpy as np
+
+import ddcuimap.utils.helper as helper
+from ddcuimap.semantic_search.utils import runners as run
+from ddcuimap.semantic_search.utils.local_pinecone import LocalPinecone
+
+from bench_exact_search import build_umls_embeddings, match_ids
+from bench_pinecone_local import build_query_embeddings
+
+
+def run_benchmark(args) -> bool:
+    cfg = helper.compose_config(
+        overrides=[
+            "custom=title_def",
+            "apis=config_pinecone_api",
+            "semantic_search=embeddings",
+        ]
+    )
+    index_cfg = cfg.semantic_search.pinecone.index
+    concurrency = cfg.apis.pinecone.index_info.concurrency
+    concurrency.requests_per_second = args.requests_per_second
+    concurrency.backoff_factor = args.backoff_factor
+    rng = np.random.default_rng(args.seed)
+    df_umls_embeddings = build_umls_embeddings(rng, args.n_vectors, args.nnz, cfg)
+    df_query_embeddings = build_query_embeddings(rng, args.n_queries, cfg)
+    n_calls = args.n_queries * len(cfg.semantic_search.query.queries.hybrid)
+    ok = True
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        pinecone = LocalPinecone(dirpath=dir_tmp)
+        pinecone.create_index(index_cfg.index_name, index_cfg.dimension, "dotproduct")
+        index = pinecone.Index(index_cfg.index_name)
+        for namespace in index_cfg.namespaces:
+            index.upsert(
+                vectors=[
+                    {
+                        "id": row.vector_id,
+                        "values": getattr(row, f"{namespace}_dense_vecs"),
+                        "sparse_values": getattr(
+                            row, f"{namespace}_sparse_vecs_upsert"
+                        ),
+                    }
+                    for row in df_umls_embeddings.itertuples()
+                ],
+                namespace=namespace,
+            )
+        index.latency = args.latency
+        index.throttle_rate = args.throttle_rate
+        print(f"{'max_workers':>11} {'q/s':>8} {'speedup':>8} {'same':>5}")
+        reference = sequential_seconds = None
+        for max_workers in args.max_workers:
+            concurrency.max_workers = max_workers
+            start = time.perf_counter()
+            var_results = run.hybrid_search_runner(
+                index, df_query_embeddings, args.alpha, cfg
+            )
+            seconds = time.perf_counter() - start
+            ids = [list(var_results)] + match_ids(var_results)
+            reference = reference or ids
+            sequential_seconds = sequential_seconds or seconds
+            same = ids == reference
+            ok = ok and same
+            print(
+                f"{max_workers:>11} {n_calls / seconds:>8.1f} "
+                f"{sequential_seconds / seconds:>8.1f} {str(same):>5}"
+            )
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="benchmark concurrent Pinecone queries"
+    )
+    parser.add_argument("--n_vectors", type=int, default=5000)
+    parser.add_argument("--n_queries", type=int, default=500)
+    parser.add_argument(
+        "--nnz", type=int, default=40, help="SPLADE nonzeros per vector"
+    )
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="modelled seconds per query"
+    )
+    parser.add_argument(
+        "--throttle_rate", type=float, default=0.01, help="share of 429 responses"
+    )
+    parser.add_argument("--max_workers", nargs="+", type=int, default=[1, 4, 8, 16])
+    parser.add_argument("--requests_per_second", type=float, default=None)
+    parser.add_argument("--backoff_factor", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    raise SystemExit(0 if run_benchmark(args) else 1)
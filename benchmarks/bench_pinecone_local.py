@@ -0,0 +1,138 @@
+"""
+
+Benchmark Pinecone upsert and hybrid_search_runner query throughput against the in-process local Pinecone stand-in
+(no network or API key needed). --latency adds artificial seconds per call to model the network round-trip.
+
+    python benchmarks/bench_pinecone_local.py --n_vectors 20000 --n_queries 500 --latency 0.0 0.02
+
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+import numpy as np
+import pandas as pd
+
+import ddcuimap.utils.helper as helper
+from ddcuimap.semantic_search.utils import runners as run
+from ddcuimap.semantic_search.utils.local_pinecone import LocalPinecone
+
+VOCAB_SIZE = 30522  # SPLADE (bert-base-uncased) vocabulary
+
+
+def random_dense(rng, n: int, dimension: int) -> np.ndarray:
+    vecs = rng.standard_normal((n, dimension)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def random_sparse(rng, n: int, nnz: int) -> list:
+    ls_sparse = []
+    for _ in range(n):
+        values = np.sort(rng.random(nnz))[::-1]
+        ls_sparse.append(
+            {
+                "indices": rng.choice(VOCAB_SIZE, nnz, replace=False).tolist(),
+                "values": (values / np.linalg.norm(values)).tolist(),
+            }
+        )
+    return ls_sparse
+
+
+def build_query_embeddings(rng, n_queries: int, cfg) -> pd.DataFrame:
+    """Synthetic df_query_embeddings with the columns hybrid_search_runner reads"""
+
+    df = pd.DataFrame(
+        {
+            cfg.custom.data_dictionary_settings.variable_column: [
+                f"Var{i}" for i in range(n_queries)
+            ],
+            "search_ID": range(1, n_queries + 1),
+        }
+    )
+    dimension = cfg.semantic_search.pinecone.index.dimension
+    for col_prefix, _ in cfg.semantic_search.query.queries.hybrid.values():
+        df[f"{col_prefix}_dense_vecs"] = random_dense(
+            rng, n_queries, dimension
+        ).tolist()
+        df[f"{col_prefix}_sparse_vecs_upsert"] = random_sparse(rng, n_queries, 10)
+    return df
+
+
+def run_benchmark(args):
+    cfg = helper.compose_config(
+        overrides=[
+            "custom=title_def",
+            "apis=config_pinecone_api",
+            "semantic_search=embeddings",
+        ]
+    )
+    index_cfg = cfg.semantic_search.pinecone.index
+    rng = np.random.default_rng(args.seed)
+    dense = random_dense(rng, args.n_vectors, index_cfg.dimension)
+    sparse = random_sparse(rng, args.n_vectors, args.nnz)
+    df_query_embeddings = build_query_embeddings(rng, args.n_queries, cfg)
+    n_calls = args.n_queries * len(cfg.semantic_search.query.queries.hybrid)
+    print(f"{'latency':>8} {'upsert/s':>10} {'query/s':>8} {'save s':>7} {'load s':>7}")
+    for latency in args.latency:
+        with tempfile.TemporaryDirectory() as dir_tmp:
+            pinecone = LocalPinecone(dirpath=dir_tmp, latency=latency)
+            pinecone.create_index(
+                name=index_cfg.index_name,
+                dimension=index_cfg.dimension,
+                metric=index_cfg.metric,
+                pod_type=index_cfg.pod_type,
+            )
+            index = pinecone.Index(index_cfg.index_name)
+            start = time.perf_counter()
+            for namespace in index_cfg.namespaces:
+                for i in range(0, args.n_vectors, 100):
+                    index.upsert(
+                        vectors=[
+                            {
+                                "id": str(j),
+                                "values": dense[j].tolist(),
+                                "sparse_values": sparse[j],
+                                "metadata": {"CUI": f"C{j:07d}", "STR": f"term {j}"},
+                            }
+                            for j in range(i, min(i + 100, args.n_vectors))
+                        ],
+                        namespace=namespace,
+                    )
+            upsert_per_second = (args.n_vectors * len(index_cfg.namespaces)) / (
+                time.perf_counter() - start
+            )
+            start = time.perf_counter()
+            index.save()
+            save_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            index = LocalPinecone(dirpath=dir_tmp, latency=latency).Index(
+                index_cfg.index_name
+            )
+            load_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            run.hybrid_search_runner(index, df_query_embeddings, args.alpha, cfg)
+            query_per_second = n_calls / (time.perf_counter() - start)
+            print(
+                f"{latency:>8} {upsert_per_second:>10.0f} {query_per_second:>8.1f} "
+                f"{save_seconds:>7.2f} {load_seconds:>7.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark local Pinecone stand-in")
+    parser.add_argument("--n_vectors", type=int, default=20000)
+    parser.add_argument("--n_queries", type=int, default=500)
+    parser.add_argument(
+        "--nnz", type=int, default=40, help="SPLADE nonzeros per vector"
+    )
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--latency", nargs="+", type=float, default=[0.0, 0.02])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    run_benchmark(args)
@@ -0,0 +1,135 @@
+"""
+
+Benchmark the SPLADE inverted index: sparse-only (alpha=0) queries scored batch-wise from the postings and one at a
+time with MaxScore pruning against the exact CSR backend, plus hybrid fusion, checking every variant returns the same
+matches. Synthetic vectors draw terms from a Zipf-like vocabulary distribution so postings lengths vary like SPLADE's.
+
+    python benchmarks/bench_sparse_search.py --n_vectors 100000 --n_queries 1000 --alpha 0.0 0.5
+
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+import numpy as np
+import pandas as pd
+
+import ddcuimap.utils.helper as helper
+from ddcuimap.semantic_search.utils import runners as run
+from ddcuimap.semantic_search.utils.exact_search import ExactHybridIndex
+from ddcuimap.semantic_search.utils.sparse_search import InvertedHybridStore
+
+from bench_exact_search import match_ids
+from bench_pinecone_local import VOCAB_SIZE, random_dense
+
+
+def zipf_sparse(rng, n: int, nnz: int) -> list:
+    """SPLADE-like sparse vectors: Zipf-distributed terms, rarer terms weighted higher, unit-normalized"""
+
+    p = 1 / np.arange(1, VOCAB_SIZE + 1) ** 1.1
+    idf = np.log1p(np.arange(1, VOCAB_SIZE + 1))
+    terms = rng.choice(VOCAB_SIZE, size=(n, nnz), p=p / p.sum())
+    ls_sparse = []
+    for row in terms:
+        indices = np.unique(row)
+        values = rng.random(len(indices)) * idf[indices]
+        ls_sparse.append(
+            {
+                "indices": indices.tolist(),
+                "values": (values / np.linalg.norm(values)).tolist(),
+            }
+        )
+    return ls_sparse
+
+
+def build_embeddings(rng, args, cfg):
+    dimension = cfg.semantic_search.pinecone.index.dimension
+    df_umls = pd.DataFrame({"vector_id": [str(i) for i in range(args.n_vectors)]})
+    df_umls["CUI"] = [f"C{i:07d}" for i in range(args.n_vectors)]
+    for col in cfg.semantic_search.upsert.embed_columns:
+        df_umls[f"{col}_dense_vecs"] = list(
+            random_dense(rng, args.n_vectors, dimension)
+        )
+        df_umls[f"{col}_sparse_vecs_upsert"] = zipf_sparse(
+            rng, args.n_vectors, args.nnz
+        )
+    df_query = pd.DataFrame(
+        {
+            cfg.custom.data_dictionary_settings.variable_column: [
+                f"Var{i}" for i in range(args.n_queries)
+            ],
+            "search_ID": range(1, args.n_queries + 1),
+        }
+    )
+    for col_prefix, _ in cfg.semantic_search.query.queries.hybrid.values():
+        df_query[f"{col_prefix}_dense_vecs"] = list(
+            random_dense(rng, args.n_queries, dimension)
+        )
+        df_query[f"{col_prefix}_sparse_vecs_upsert"] = zipf_sparse(
+            rng, args.n_queries, args.query_nnz
+        )
+    return df_umls, df_query
+
+
+def run_benchmark(args) -> bool:
+    cfg = helper.compose_config(
+        overrides=[
+            "custom=title_def",
+            "apis=config_pinecone_api",
+            "semantic_search=embeddings",
+        ]
+    )
+    index_cfg = cfg.semantic_search.pinecone.index
+    df_umls, df_query = build_embeddings(np.random.default_rng(args.seed), args, cfg)
+    n_calls = args.n_queries * len(cfg.semantic_search.query.queries.hybrid)
+    ok = True
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        start = time.perf_counter()
+        index = InvertedHybridStore(dir_tmp).build_index(
+            index_cfg.index_name,
+            df_umls,
+            cfg.semantic_search.upsert.embed_columns,
+            ["CUI"],
+            index_cfg.dimension,
+            index_cfg.metric,
+        )
+        print(f"built exact files and postings in {time.perf_counter() - start:.1f} s")
+        exact_index = ExactHybridIndex(index.dirpath)
+        print(f"{'alpha':>6} {'backend':>18} {'q/s':>8} {'same':>5}")
+        for alpha in args.alpha:
+            reference = None
+            for name, backend, pruning in [
+                ("exact CSR", exact_index, None),
+                ("inverted", index, False),
+                ("inverted MaxScore", index, True),
+            ]:
+                if pruning is not None:
+                    if alpha > 0 and pruning:
+                        continue  # pruning only applies to sparse-only queries
+                    backend.pruning = pruning
+                start = time.perf_counter()
+                ids = match_ids(run.hybrid_search_runner(backend, df_query, alpha, cfg))
+                per_second = n_calls / (time.perf_counter() - start)
+                reference = reference or ids
+                same = ids == reference
+                ok = ok and same
+                print(f"{alpha:>6} {name:>18} {per_second:>8.0f} {str(same):>5}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark SPLADE inverted index")
+    parser.add_argument("--n_vectors", type=int, default=100000)
+    parser.add_argument("--n_queries", type=int, default=1000)
+    parser.add_argument("--nnz", type=int, default=60, help="terms drawn per vector")
+    parser.add_argument("--query_nnz", type=int, default=15, help="terms per query")
+    parser.add_argument("--alpha", nargs="+", type=float, default=[0.0, 0.5])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    raise SystemExit(0 if run_benchmark(args) else 1)
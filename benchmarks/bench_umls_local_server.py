@@ -0,0 +1,111 @@
+"""
+
+Benchmark umls_runner end to end (HTTP session, rate limiter, retries, concurrency) against the local UMLS REST
+stand-in server (no network or API key needed). Exits non-zero if throughput falls below --min_rows_per_second
+or results differ between worker counts, so it can gate CI.
+
+    python benchmarks/bench_umls_local_server.py --n_rows 2000 --max_workers 1 4 8 --latency 0.02 --rate_429 0.01
+
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+import pandas as pd
+
+import ddcuimap.utils.helper as helper
+from ddcuimap.umls.utils import runner
+from ddcuimap.umls.utils.local_server import LocalUMLSServer
+
+
+def build_curation_dataframe(n_rows: int, index, cfg) -> pd.DataFrame:
+    """Synthetic curation dataframe drawing query terms from the server's index (with some misses)"""
+
+    names = sorted(index.preferred_name.values())
+    return pd.DataFrame(
+        {
+            cfg.custom.data_dictionary_settings.variable_column: [
+                f"Var{i}" for i in range(n_rows)
+            ],
+            "search_ID": range(1, n_rows + 1),
+            "query_term_1": [
+                names[i % len(names)] if i % 5 else f"unknown term {i}"
+                for i in range(n_rows)
+            ],
+            "query_term_2": [
+                f"{names[(3 * i) % len(names)]} level" for i in range(n_rows)
+            ],
+        }
+    )
+
+
+def run_benchmark(args) -> bool:
+    cfg = helper.compose_config(overrides=["custom=de", "apis=config_umls_api"])
+    api_settings = cfg.apis.umls.api_settings
+    cfg.apis.umls.user_info.apiKey = "local"
+    cfg.apis.umls.query_params.apiKey = "local"
+    api_settings.cache.enabled = False
+    api_settings.concurrency.requests_per_second = args.requests_per_second
+    cfg.http_session.backoff_factor = 0.01
+    cfg.http_session.backoff_jitter = 0.01
+    ok = True
+    with LocalUMLSServer(
+        port=0,
+        latency=args.latency,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        seed=args.seed,
+    ) as server:
+        api_settings.fullpath = server.fullpath
+        api_settings.url = server.api_key_url
+        df_curation = build_curation_dataframe(args.n_rows, server.index, cfg)
+        print(
+            f"{'workers':>8} {'seconds':>8} {'rows/s':>8} {'results':>8} {'429s':>5} {'5xx':>5}"
+        )
+        df_reference = None
+        for max_workers in args.max_workers:
+            api_settings.concurrency.max_workers = max_workers
+            counts = dict(server.counts)
+            df_results = pd.DataFrame(
+                columns=cfg.custom.curation_settings.query_columns
+                + cfg.custom.curation_settings.result_columns
+            )
+            start = time.perf_counter()
+            df_results = runner.umls_runner(df_results, df_curation, cfg)
+            elapsed = time.perf_counter() - start
+            rows_per_second = args.n_rows / elapsed
+            print(
+                f"{max_workers:>8} {elapsed:>8.2f} {rows_per_second:>8.1f} {len(df_results):>8} "
+                f"{server.counts['429'] - counts['429']:>5} {server.counts['5xx'] - counts['5xx']:>5}"
+            )
+            if df_reference is None:
+                df_reference = df_results
+            elif not df_results.equals(df_reference):
+                print(f"Results with {max_workers} workers differ from the first run.")
+                ok = False
+            if rows_per_second < args.min_rows_per_second:
+                print(
+                    f"Throughput {rows_per_second:.1f} rows/s is below {args.min_rows_per_second}."
+                )
+                ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark umls_runner over HTTP")
+    parser.add_argument("--n_rows", type=int, default=2000)
+    parser.add_argument("--max_workers", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--rate_429", type=float, default=0.01)
+    parser.add_argument("--rate_5xx", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests_per_second", type=float, default=1000)
+    parser.add_argument("--min_rows_per_second", type=float, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    sys.exit(0 if run_benchmark(args) else 1)
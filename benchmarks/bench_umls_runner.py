@@ -0,0 +1,86 @@
+"""
+
+Benchmark umls_runner result accumulation against a stubbed UMLS API (no network or API key needed).
+
+Runtime per row should stay flat from 1k to 50k rows now that results are accumulated as records.
+
+    python benchmarks/bench_umls_runner.py --sizes 1000 5000 10000 25000 50000
+
+"""
+
+import argparse
+import logging
+import os
+import time
+import zlib
+
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+import pandas as pd
+
+import ddcuimap.utils.helper as helper
+from ddcuimap.umls.utils import runner
+from ddcuimap.umls.utils import umls_query_processing_functions as uqproc
+
+
+def stub_query_umls_api(fullpath: str, query_params: dict) -> dict:
+    """Deterministic stand-in for query_umls_api: every third term misses the exact search"""
+
+    term = str(query_params["string"])
+    n_results = (
+        0
+        if zlib.crc32(term.encode()) % 3 == 0 and query_params["searchType"] == "exact"
+        else 5
+    )
+    return {
+        "recCount": n_results,
+        "results": [
+            {"name": f"{term} {i}", "ui": f"C{i:07d}", "rootSource": "NCI"}
+            for i in range(n_results)
+        ],
+    }
+
+
+def build_curation_dataframe(n_rows: int, cfg) -> pd.DataFrame:
+    """Synthetic curation dataframe with two query term columns (some empty)"""
+
+    return pd.DataFrame(
+        {
+            cfg.custom.data_dictionary_settings.variable_column: [
+                f"Var{i}" for i in range(n_rows)
+            ],
+            "search_ID": range(1, n_rows + 1),
+            "query_term_1": [f"title {i}" if i % 10 else "" for i in range(n_rows)],
+            "query_term_2": [f"definition {i}" for i in range(n_rows)],
+        }
+    )
+
+
+def run_benchmark(sizes):
+    cfg = helper.compose_config(overrides=["custom=de", "apis=config_umls_api"])
+    cfg.apis.umls.api_settings.cache.enabled = False
+    cfg.apis.umls.api_settings.concurrency.requests_per_second = 1e9
+    uqproc.query_umls_api = stub_query_umls_api
+    print(f"{'rows':>8} {'results':>9} {'seconds':>9} {'ms/row':>8}")
+    for n_rows in sizes:
+        df_curation = build_curation_dataframe(n_rows, cfg)
+        df_results = pd.DataFrame(
+            columns=cfg.custom.curation_settings.query_columns
+            + cfg.custom.curation_settings.result_columns
+        )
+        start = time.perf_counter()
+        df_results = runner.umls_runner(df_results, df_curation, cfg)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{n_rows:>8} {len(df_results):>9} {elapsed:>9.2f} {1000 * elapsed / n_rows:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark umls_runner")
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=[1000, 5000, 10000, 25000, 50000]
+    )
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    run_benchmark(args.sizes)
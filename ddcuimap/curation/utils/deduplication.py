@@ -0,0 +1,99 @@
+"""
+
+Functions for collapsing rows with identical query terms before querying a search backend and fanning the
+results back out to every search_ID afterwards.
+
+"""
+
+import re
+
+import pandas as pd
+
+from ddcuimap.curation import cur_logger, log
+
+
+def get_query_terms_cols(df) -> list:
+    """Return query_term_N columns in order"""
+
+    return [col for col in df.columns if re.search(r"^query_term_\d+$", col)]
+
+
+def normalize_query_terms(series: pd.Series) -> pd.Series:
+    """Normalize query terms for comparison (case and whitespace insensitive, nan/empty as blank)"""
+
+    return (
+        series.fillna("")
+        .astype(str)
+        .str.casefold()
+        .str.split()
+        .str.join(" ")
+        .replace("nan", "")
+    )
+
+
+@log(msg="Deduplicating query terms")
+def deduplicate_query_terms(df_curation, cfg):
+    """Keep the first row for every unique combination of normalized query terms and map each search_ID to it"""
+
+    query_terms_cols = get_query_terms_cols(df_curation)
+    if (
+        not cfg.custom.data_dictionary_settings.get("deduplicate_query_terms")
+        or not query_terms_cols
+    ):
+        return df_curation, None
+    variable_column = cfg.custom.data_dictionary_settings.variable_column
+    keys = pd.concat(
+        [normalize_query_terms(df_curation[col]) for col in query_terms_cols], axis=1
+    ).apply(tuple, axis=1)
+    search_ID_query = (
+        df_curation["search_ID"].groupby(keys, sort=False).transform("first")
+    )
+    df_dedup_map = pd.DataFrame(
+        {
+            "search_ID": df_curation["search_ID"].values,
+            "search_ID_query": search_ID_query.values,
+            variable_column: df_curation[variable_column].values,
+            **{col: df_curation[col].values for col in query_terms_cols},
+        }
+    )
+    df_query = df_curation[df_curation["search_ID"] == search_ID_query].copy()
+    n_rows, n_unique = len(df_curation), len(df_query)
+    dedup_ratio = 1 - n_unique / n_rows if n_rows else 0
+    cur_logger.info(
+        f"Deduplicated query terms: {n_unique} unique of {n_rows} rows ({dedup_ratio:.1%} of queries saved)."
+    )
+    return df_query, df_dedup_map
+
+
+@log(msg="Fanning out deduplicated results to every search_ID")
+def fan_out_results(df_results, df_dedup_map, cfg):
+    """Copy results of each queried search_ID to every search_ID that shares its query terms"""
+
+    if df_dedup_map is None:
+        return df_results
+    variable_column = cfg.custom.data_dictionary_settings.variable_column
+    query_terms_cols = get_query_terms_cols(df_dedup_map)
+    columns = list(df_results.columns)
+    df_results = df_results.rename(columns={"search_ID": "search_ID_query"})
+    if variable_column in df_results.columns:
+        df_results = df_results.drop(columns=variable_column)
+    df_results = pd.merge(
+        df_dedup_map[["search_ID", "search_ID_query", variable_column]],
+        df_results,
+        on="search_ID_query",
+        how="inner",
+    ).sort_values(
+        "search_ID", kind="stable"
+    )  # stable sort keeps the result order within each search_ID
+    df_results = df_results[[col for col in columns if col in df_results.columns]]
+
+    # RESTORE EACH SEARCH_ID'S OWN QUERY TERM (ROWS WERE MATCHED CASE/WHITESPACE INSENSITIVELY)
+    term_column, term_col_column = cfg.custom.curation_settings.query_columns[2:4]
+    if {term_column, term_col_column}.issubset(df_results.columns):
+        df_terms = df_dedup_map.set_index("search_ID")
+        for col in query_terms_cols:
+            used = df_results[term_col_column] == col
+            df_results.loc[used, term_column] = df_results.loc[used, "search_ID"].map(
+                df_terms[col]
+            )
+    return df_results.reset_index(drop=True)
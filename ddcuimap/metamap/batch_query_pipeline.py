@@ -9,9 +9,11 @@ from pathlib import Path
 from ddcuimap.metamap import mm_logger, log, copy_log
 import ddcuimap.utils.helper as helper
 import ddcuimap.curation.utils.process_data_dictionary as proc_dd
+from ddcuimap.utils import http_session
 
 # MetaMap API
 from ddcuimap.curation.utils import curation_functions as cur
+from ddcuimap.curation.utils import deduplication as dedup
 from ddcuimap.metamap.utils.api_connection import check_credentials
 from ddcuimap.metamap.utils import (
     metamap_query_processing_functions as mm_qproc,
@@ -28,6 +30,7 @@ cfg = helper.compose_config(
 def run_mm_batch(cfg, **kwargs):
     # API CONNECTION
     cfg = check_credentials(cfg)
+    http_session.configure_session(cfg.get("http_session"))
 
     # INPUTS/OUTPUTS
     df_dd = kwargs.get("df_dd")
@@ -58,19 +61,17 @@ def run_mm_batch(cfg, **kwargs):
 
     # FORMAT METAMAP BATCH INPUT
     df_mm_input = mm_qproc.format_for_metamap(df_curation, cfg)
+    df_mm_input, df_dedup_map = dedup.deduplicate_query_terms(df_mm_input, cfg)
     fp_mm_inputfile = mm_qproc.create_mm_inputfile(df_mm_input, dir_step1)
 
-    # RUN METAMAP BATCH
-    response = mm_qproc.run_batch_metamap_api(fp_mm_inputfile, cfg)
+    # RUN METAMAP BATCH (only lines missing from the MetaMap cache are submitted)
+    df_results = mm_qproc.run_cached_batch_metamap_api(fp_mm_inputfile, cfg, dir_step1)
 
     # FORMAT METAMAP OUTPUT
-    if response.status_code == 200:
-        mm_json = mm_qproc.mm_output_to_json(response)
-        fp_mm_json = mm_qproc.save_mm_output_json(mm_json, dir_step1)
-        df_results = mm_qproc.process_mm_json_to_df(mm_json, cfg)
+    if df_results is not None:
         df_results = mm_qproc.rename_mm_columns(df_results, cfg)
+        df_results = dedup.fan_out_results(df_results, df_dedup_map, cfg)
     else:
-        mm_logger.warning(response.text)
         mm_logger.error("MetaMap batch query pipeline failed!!!")
         sys.exit()
 
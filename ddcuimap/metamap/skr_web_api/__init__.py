@@ -1,6 +1,6 @@
 import os.path
-import requests
 
+from ddcuimap.utils.http_session import get_session
 from .casauth import get_ticket
 
 CAS_SERVERURL = "https://utslogin.nlm.nih.gov/cas/v1"
@@ -23,6 +23,8 @@ class Submission:
         self.tgtserverurl = CAS_SERVERURL + "/api-key"
         # service ticket server
         self.stserverurl = CAS_SERVERURL + "/tickets"
+        # batch jobs block until MetaMap finishes, so only the connection is timed out
+        self.timeout = (30, None)
 
     def set_casserverurl(self, cas_serverurl):
         """set CAS server url"""
@@ -90,11 +92,12 @@ class Submission:
     def set_apikey(self, apikey):
         self.apikey = apikey
 
-    def submit(self):
+    def submit(self, stream=False):
+        """submit request; stream=True leaves the response body unread so it can be streamed to disk"""
         serviceticket = get_ticket(self.casserverurl, self.apikey, self.serviceurl)
         params = {"ticket": serviceticket}
         headers = {"Accept": "application/json"}
-        s = requests.Session()
+        s = get_session()
         response = s.post(
             self.serviceurl,
             self.form,
@@ -102,6 +105,8 @@ class Submission:
             headers=headers,
             params=params,
             allow_redirects=False,
+            timeout=self.timeout,
+            stream=stream,
         )
         # handle the redirect manually
         if response.status_code == 302:
@@ -113,5 +118,7 @@ class Submission:
                 headers=headers,
                 params=params,
                 allow_redirects=False,
+                timeout=self.timeout,
+                stream=stream,
             )
         return response
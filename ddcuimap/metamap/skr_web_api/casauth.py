@@ -1,9 +1,19 @@
 import argparse
-
-import requests
-from requests_html import HTML
+import hashlib
+import json
+import os
+import threading
+import time
 
 from ddcuimap.metamap import mm_logger
+from ddcuimap.utils.http_session import get_session
+from ddcuimap.utils.sqlite_cache import DEFAULT_CACHE_DIR
+
+TGT_CACHE_FILEPATH = DEFAULT_CACHE_DIR / "cas_tgt.json"
+TGT_LIFETIME_SECONDS = 7 * 60 * 60  # UTS TGTs are valid for 8 hours; renew early
+
+_tgt_cache = {}
+_tgt_lock = threading.Lock()
 
 
 def get_service_ticket(serverurl, ticket_granting_ticket, serviceurl):
@@ -25,7 +35,7 @@ def get_service_ticket(serverurl, ticket_granting_ticket, serviceurl):
     @param ticketGrantingTicket a Proxy Granting Ticket.
     @param serviceurl url of service with protected resources
     @return authentication ticket for service."""
-    resp = requests.post(
+    resp = get_session().post(
         "{}/{}".format(serverurl, ticket_granting_ticket), {"service": serviceurl}
     )
     if resp.status_code == 200:
@@ -35,6 +45,8 @@ def get_service_ticket(serverurl, ticket_granting_ticket, serviceurl):
 
 def extract_tgt_ticket(htmlcontent):
     "Extract ticket granting ticket from HTML."
+    from requests_html import HTML  # only needed when the Location header is missing
+
     # mm_logger.info('htmlcontent: {}'.format(htmlcontent))
     html = HTML(html=htmlcontent)
     # get form element
@@ -48,6 +60,14 @@ def extract_tgt_ticket(htmlcontent):
         return "form element missing from ticket granting ticket response"
 
 
+def extract_tgt_from_response(response):
+    """Extract ticket granting ticket from the Location header, falling back to parsing the HTML form."""
+    location = response.headers.get("Location")
+    if location:
+        return location.rstrip("/").split("/")[-1]
+    return extract_tgt_ticket(response.content)
+
+
 def get_ticket_granting_ticket(tgtserverurl, apikey):
     """Obtain a Proxy Granting Ticket.
     Response for a Ticket Granting Ticket Resource
@@ -69,10 +89,70 @@ def get_ticket_granting_ticket(tgtserverurl, apikey):
     Returns:
       a Proxy Granting Ticket.
     """
-    response = requests.post(
+    response = get_session().post(
         tgtserverurl, {"apikey": apikey}, headers={"Accept": "test/plain"}
     )
-    return extract_tgt_ticket(response.content)
+    return extract_tgt_from_response(response)
+
+
+def _tgt_cache_key(tgtserverurl, apikey):
+    """Key cached TGTs by server and a hash of the api key so the key itself is never written to disk."""
+    return hashlib.sha256(f"{tgtserverurl}|{apikey}".encode()).hexdigest()
+
+
+def _load_tgt_file():
+    try:
+        with open(TGT_CACHE_FILEPATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_tgt_file(entries):
+    """Atomically write the TGT cache file, readable only by the current user."""
+    try:
+        TGT_CACHE_FILEPATH.parent.mkdir(parents=True, exist_ok=True)
+        fp_tmp = TGT_CACHE_FILEPATH.with_suffix(f".{os.getpid()}.tmp")
+        fd = os.open(fp_tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(fp_tmp, TGT_CACHE_FILEPATH)
+    except OSError as e:
+        mm_logger.warning(f"Could not write TGT cache {TGT_CACHE_FILEPATH}: {e}")
+
+
+def get_cached_ticket_granting_ticket(tgtserverurl, apikey, refresh=False):
+    """Obtain a Proxy Granting Ticket, reusing an unexpired one cached in memory or on disk.
+
+    Parameters:
+      tgtserverurl: ticket granting ticket server
+      apikey: UTS profile API key
+      refresh: ignore any cached TGT (e.g., after it was rejected) and re-authenticate
+
+    Returns:
+      a Proxy Granting Ticket.
+    """
+    key = _tgt_cache_key(tgtserverurl, apikey)
+    with _tgt_lock:
+        now = time.time()
+        if not refresh:
+            entry = _tgt_cache.get(key) or _load_tgt_file().get(key)
+            if entry is not None and entry["expires"] > now:
+                _tgt_cache[key] = entry
+                return entry["tgt"]
+        tgt = get_ticket_granting_ticket(tgtserverurl, apikey)
+        if not str(tgt).startswith("TGT-"):
+            mm_logger.warning(f"Ticket granting ticket request failed: {tgt}")
+            return tgt
+        entry = {"tgt": tgt, "expires": now + TGT_LIFETIME_SECONDS}
+        _tgt_cache[key] = entry
+        entries = {
+            k: v for k, v in _load_tgt_file().items() if v.get("expires", 0) > now
+        }  # drop expired TGTs of other keys/servers
+        entries[key] = entry
+        _save_tgt_file(entries)
+        mm_logger.info("Obtained new ticket granting ticket.")
+        return tgt
 
 
 def get_ticket(cas_serverurl, apikey, serviceurl):
@@ -99,15 +179,21 @@ def get_ticket(cas_serverurl, apikey, serviceurl):
     tgtserverurl = cas_serverurl + "/api-key"
     # set service ticket server url
     stserverurl = cas_serverurl + "/tickets"
-    tgt = get_ticket_granting_ticket(tgtserverurl, apikey)
-    return get_service_ticket(stserverurl, tgt, serviceurl)
+    tgt = get_cached_ticket_granting_ticket(tgtserverurl, apikey)
+    serviceticket = get_service_ticket(stserverurl, tgt, serviceurl)
+    if isinstance(serviceticket, str) and serviceticket.startswith("Error"):
+        # cached TGT expired early or was revoked, so re-authenticate once
+        mm_logger.warning(f"Service ticket request failed ({serviceticket}).")
+        tgt = get_cached_ticket_granting_ticket(tgtserverurl, apikey, refresh=True)
+        serviceticket = get_service_ticket(stserverurl, tgt, serviceurl)
+    return serviceticket
 
 
 def get_protected_document(service_url, serviceticket):
     """get document protected by CAS Authentication."""
     url = "%s?ticket=%s" % (service_url, serviceticket)
     params = {"ticket": serviceticket}
-    s = requests.Session()
+    s = get_session()
     response = s.get(url, params=params)
     # handle the redirect manually
     if response.status_code == 302:
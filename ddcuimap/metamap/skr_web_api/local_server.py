@@ -0,0 +1,320 @@
+"""
+
+Local stand-in for the NLM CAS (UTS) ticket service and SKR batch API used by skr_web_api.Submission.
+
+Speaks the CAS api-key -> TGT -> service ticket flow and the API_batchValidationII.pl multipart batch upload, and
+returns synthetic but realistically shaped MetaMap output (--JSONf/--JSONn AllDocuments or -N fielded MMI) with
+configurable latency and payload size, so chunking, ticket caching and parsing can be benchmarked with no network.
+
+    python -m ddcuimap.metamap.skr_web_api.local_server --port 8081 --latency 2 --latency_per_line 0.01
+
+then point the MetaMap config at it:
+
+    apis.metamap.api_settings.casserverurl=http://127.0.0.1:8081/cas/v1
+    apis.metamap.api_settings.serviceurl=http://127.0.0.1:8081/cgi-bin/II/UTS_Required/API_batchValidationII.pl
+
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+import zlib
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from ddcuimap.metamap import mm_logger
+
+CAS_PATH = "/cas/v1"
+BATCH_PATH = "/cgi-bin/II/UTS_Required/API_batchValidationII.pl"
+SEMTYPES = ["dsyn", "sosy", "fndg", "diap", "lbpr", "clna", "orgf", "qnco", "inpr"]
+SOURCES = ["NCI", "MSH", "SNOMEDCT_US", "MTH", "LNC", "MDR"]
+SCORES = [1000, 966, 913, 888, 861, 827, 790, 753, 694, 645]
+
+
+def synthetic_candidates(text: str, max_candidates: int) -> list:
+    """Deterministic MetaMap-like candidates for an input text (same text -> same candidates)"""
+
+    rng = random.Random(zlib.crc32(text.encode("utf-8")))
+    words = text.split() or [text]
+    candidates = []
+    for _ in range(rng.randint(0, max_candidates)):
+        matched = " ".join(rng.sample(words, rng.randint(1, len(words))))
+        candidates.append(
+            {
+                "CandidateScore": str(-rng.choice(SCORES)),
+                "CandidateCUI": f"C{rng.randrange(10**7):07d}",
+                "CandidateMatched": matched,
+                "CandidatePreferred": matched.title(),
+                "MatchedWords": matched.lower().split(),
+                "SemTypes": rng.sample(SEMTYPES, rng.randint(1, 2)),
+                "MatchMaps": [
+                    {
+                        "TextMatchStart": str(i + 1),
+                        "TextMatchEnd": str(i + 1),
+                        "ConcMatchStart": str(i + 1),
+                        "ConcMatchEnd": str(i + 1),
+                        "LexVariation": "0",
+                    }
+                    for i in range(len(matched.split()))
+                ],
+                "IsHead": rng.choice(["yes", "no"]),
+                "IsOverMatch": "no",
+                "Sources": rng.sample(SOURCES, rng.randint(1, 3)),
+                "ConceptPIs": [{"StartPos": "0", "Length": str(len(matched))}],
+                "Status": "0",
+                "Negated": "0",
+            }
+        )
+    return candidates
+
+
+def mm_document(pmid: str, text: str, max_candidates: int) -> dict:
+    """MetaMap JSON document for one SingLinePMID input line"""
+
+    return {
+        "Document": {
+            "Cmd": "metamap",
+            "Utterances": [
+                {
+                    "PMID": pmid,
+                    "UttSection": "tx",
+                    "UttNum": "1",
+                    "UttText": text,
+                    "UttStartPos": "0",
+                    "UttLength": str(len(text)),
+                    "Phrases": [
+                        {
+                            "PhraseText": text,
+                            "SyntaxUnits": [],
+                            "PhraseStartPos": "0",
+                            "PhraseLength": str(len(text)),
+                            "Candidates": synthetic_candidates(text, max_candidates),
+                            "Mappings": [],
+                        }
+                    ],
+                }
+            ],
+            "AAs": [],
+            "Negations": [],
+        }
+    }
+
+
+def mmi_lines(pmid: str, text: str, max_candidates: int) -> list:
+    """Fielded MMI lines for one SingLinePMID input line"""
+
+    return [
+        f"{pmid}|MMI|{1000 + int(c['CandidateScore']) / 2 + 10:.2f}|{c['CandidatePreferred']}|{c['CandidateCUI']}|"
+        f"[{','.join(c['SemTypes'])}]|[\"{c['CandidatePreferred']}\"-tx-1-\"{c['CandidateMatched']}\"-noun-0]|"
+        f"TX|0/{len(text)}|"
+        for c in synthetic_candidates(text, max_candidates)
+    ]
+
+
+def batch_output(input_text: str, batch_command: str, max_candidates: int) -> bytes:
+    """MetaMap batch output for a SingLinePMID upload in the format requested by Batch_Command"""
+
+    lines = [line.split("|", 1) for line in input_text.splitlines() if "|" in line]
+    flags = batch_command.split()
+    if "-N" in flags:
+        return "".join(
+            line + "\n"
+            for pmid, text in lines
+            for line in mmi_lines(pmid, text, max_candidates)
+        ).encode("utf-8")
+    mm_json = {
+        "AllDocuments": [
+            mm_document(pmid, text, max_candidates) for pmid, text in lines
+        ]
+    }
+    indent = 2 if "--JSONf" in flags else None
+    separators = None if indent else (",", ":")
+    return json.dumps(mm_json, indent=indent, separators=separators).encode("utf-8")
+
+
+def parse_multipart(content_type: str, body: bytes) -> dict:
+    """Parses a multipart/form-data body into {field name: bytes}"""
+
+    message = BytesParser(policy=default_policy).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+    )
+    return {
+        part.get_param("name", header="content-disposition"): part.get_payload(
+            decode=True
+        )
+        for part in message.iter_parts()
+    }
+
+
+class LocalSKRServer(ThreadingHTTPServer):
+    """Models the CAS ticket service and SKR batch endpoint in one threaded HTTP server."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8081,
+        latency: float = 0.0,
+        latency_per_line: float = 0.0,
+        max_candidates: int = 5,
+        max_jobs: int = 0,
+        not_done_loop: bool = True,
+    ) -> None:
+        super().__init__((host, port), LocalSKRRequestHandler)
+        self.latency = latency
+        self.latency_per_line = latency_per_line
+        self.max_candidates = max_candidates
+        self.not_done_loop = not_done_loop
+        self.job_slots = threading.BoundedSemaphore(max_jobs) if max_jobs else None
+        self.tgts = set()
+        self.service_tickets = set()
+        self.counts = {"tgt": 0, "st": 0, "batch": 0, "lines": 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def casserverurl(self) -> str:
+        return self.url + CAS_PATH
+
+    @property
+    def serviceurl(self) -> str:
+        return self.url + BATCH_PATH
+
+    def new_ticket(self, kind: str) -> str:
+        with self._lock:
+            ticket = f"{kind.upper()}-{next(self._ids)}-local"
+            self.counts[kind] += 1
+            (self.tgts if kind == "tgt" else self.service_tickets).add(ticket)
+        return ticket
+
+    def redeem_service_ticket(self, ticket: str) -> bool:
+        """Service tickets are single use"""
+        with self._lock:
+            if ticket in self.service_tickets:
+                self.service_tickets.remove(ticket)
+                return True
+        return False
+
+    def start(self) -> "LocalSKRServer":
+        """Serve in a background daemon thread"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        mm_logger.info(f"Local SKR/CAS stand-in listening on {self.url}")
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class LocalSKRRequestHandler(BaseHTTPRequestHandler):
+    """Handles CAS api-key/tickets and SKR batch POSTs for LocalSKRServer."""
+
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes: without TCP_NODELAY, keep-alive requests stall ~40 ms on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args) -> None:
+        pass  # keep benchmark output clean
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        body = self.read_body()
+        server = self.server
+        if url.path == f"{CAS_PATH}/api-key":
+            if not parse_qs(body.decode()).get("apikey"):
+                return self.send_body(401, b"apikey missing", "text/plain")
+            tgt = server.new_ticket("tgt")
+            location = f"{server.casserverurl}/tickets/{tgt}"
+            html = f'<html><body><form action="{location}" method="POST"></form></body></html>'
+            return self.send_body(
+                201, html.encode(), "text/html", {"Location": location}
+            )
+        if url.path.startswith(f"{CAS_PATH}/tickets/"):
+            tgt = url.path.rsplit("/", 1)[-1]
+            if tgt not in server.tgts:
+                return self.send_body(404, b"TGT not found", "text/plain")
+            return self.send_body(200, server.new_ticket("st").encode(), "text/plain")
+        if url.path == BATCH_PATH:
+            ticket = parse_qs(url.query).get("ticket", [""])[0]
+            if not server.redeem_service_ticket(ticket):
+                return self.send_body(403, b"Invalid service ticket", "text/plain")
+            return self.handle_batch(body)
+        self.send_body(404, b"Not found", "text/plain")
+
+    def handle_batch(self, body: bytes) -> None:
+        server = self.server
+        fields = parse_multipart(self.headers.get("Content-Type", ""), body)
+        input_text = (fields.get("UpLoad_File") or b"").decode("utf-8")
+        batch_command = (fields.get("Batch_Command") or b"").decode("utf-8")
+        n_lines = sum(1 for line in input_text.splitlines() if line.strip())
+        if server.job_slots:
+            server.job_slots.acquire()  # queue like SKR does beyond its concurrent job limit
+        try:
+            time.sleep(server.latency + server.latency_per_line * n_lines)
+            output = batch_output(input_text, batch_command, server.max_candidates)
+        finally:
+            if server.job_slots:
+                server.job_slots.release()
+        with server._lock:
+            server.counts["batch"] += 1
+            server.counts["lines"] += n_lines
+        if server.not_done_loop and "-N" not in batch_command.split():
+            output = (
+                b"NOT DONE LOOP\n" + output
+            )  # SKR prefixes some JSON outputs with this
+        self.send_body(200, output, "application/json")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="local SKR/CAS stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per job")
+    parser.add_argument(
+        "--latency_per_line", type=float, default=0.0, help="seconds per input line"
+    )
+    parser.add_argument("--max_candidates", type=int, default=5)
+    parser.add_argument("--max_jobs", type=int, default=0, help="0 = unlimited")
+    args = parser.parse_args()
+    server = LocalSKRServer(
+        args.host,
+        args.port,
+        latency=args.latency,
+        latency_per_line=args.latency_per_line,
+        max_candidates=args.max_candidates,
+        max_jobs=args.max_jobs,
+    )
+    mm_logger.info(f"Local SKR/CAS stand-in listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -5,35 +5,75 @@ This module contains functions for processing query terms for MetaMap ingestion
 """
 
 
+import gzip
+import hashlib
 import json
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import requests
+from tqdm import tqdm
 
 from ddcuimap.metamap import mm_logger, log
-from ddcuimap.metamap.skr_web_api import Submission
-from ddcuimap.curation.utils.text_processing import (
-    check_query_terms_valid,
-    unescape_string,
-)
+from ddcuimap.metamap.skr_web_api import Submission, CAS_SERVERURL
+from ddcuimap.utils.sqlite_cache import SQLiteCache, DEFAULT_CACHE_DIR
+from ddcuimap.curation.utils.deduplication import get_query_terms_cols
+from ddcuimap.curation.utils.text_processing import unescape_string
+
+NOT_DONE_LOOP = "NOT DONE LOOP"
+mm_cache = None
+MM_OUTPUT_FLAGS = {"JSONf": "--JSONf 2", "JSONn": "--JSONn", "MMI": "-N"}
+MMI_TRIGGER = re.compile(r'"[^"]*"-[^-]*-\d+-"([^"]*)"-[^-]*-(\d)')
 
 
 @log(msg="Formatting query terms for MetaMap")
 def format_for_metamap(df: pd.DataFrame, cfg) -> pd.DataFrame:
     """Formats query term for MetaMap ingestion"""
 
-    # TODO: figure out how to add cfg.data_dictionary_settings.search_all_query_term parameter
-    query_terms_cols = [col for col in df.columns if re.search(r"query_term_\d+", col)]
-    # for every row in df check if there is a valid value in one of the query_term_columns, if so combine the variable_column and the first valid query_term_column in MetaMap_input column, but if there's not leave MetaInput_column blank blank
-    for index, row in df.iterrows():
-        for col in query_terms_cols:
-            if check_query_terms_valid(row[col]):
-                df.loc[
-                    index, "MetaMap_input"
-                ] = f"{row[cfg.custom.data_dictionary_settings.variable_column]}_{row['search_ID']}|{row[col]}"
-                break
-            else:
-                df.loc[index, "MetaMap_input"] = ""
+    query_terms_cols = get_query_terms_cols(df)
+    if not query_terms_cols:
+        df["MetaMap_input"] = ""
+        return df
+    pmid_prefix = (
+        df[cfg.custom.data_dictionary_settings.variable_column].astype(str) + "_"
+    )
+    search_ID = df["search_ID"].astype(str)
+    terms = df[query_terms_cols]
+    valid = terms.notna() & terms.astype(str).ne("")  # same as check_query_terms_valid
+    if cfg.custom.data_dictionary_settings.search_all_query_terms:
+        # one line per valid query term with PMID {variable}_{N}_{search_ID}, joined by newlines
+        lines = pd.DataFrame(
+            {
+                col: pmid_prefix
+                + col.split("_")[-1]
+                + "_"
+                + search_ID
+                + "|"
+                + terms[col].astype(str)
+                for col in query_terms_cols
+            }
+        ).where(valid)
+        df["MetaMap_input"] = (
+            lines.stack()
+            .groupby(level=0, sort=False)
+            .agg("\n".join)
+            .reindex(df.index, fill_value="")
+        )
+    else:
+        # PMID {variable}_{search_ID} with the first valid query term
+        first_valid = terms.to_numpy(dtype=object)[
+            np.arange(len(df)), valid.to_numpy().argmax(axis=1)
+        ]
+        df["MetaMap_input"] = (
+            pmid_prefix
+            + search_ID
+            + "|"
+            + pd.Series(first_valid, index=df.index).astype(str)
+        ).where(valid.any(axis=1), "")
     return df
 
 
@@ -41,14 +81,11 @@ def format_for_metamap(df: pd.DataFrame, cfg) -> pd.DataFrame:
 def create_mm_inputfile(df: pd.DataFrame, dir_step1):  # TODO: add file name as argument
     """Creates file for MetaMap input"""
 
-    # create a new dataframe with only the MetaMap_input column but first remove rows that are null
-    df_mm_inputfile = df[df["MetaMap_input"] != ""]
-    df_mm_inputfile = df_mm_inputfile["MetaMap_input"]
+    # keep non-empty MetaMap_input cells and write them in a single call
+    df_mm_inputfile = df.loc[df["MetaMap_input"] != "", "MetaMap_input"]
     fp_mm_inputfile = f"{dir_step1}/metamap-search_inputfile_SingLinePMID.txt"
     with open(fp_mm_inputfile, "w") as f:
-        for cell in df_mm_inputfile:
-            f.write(cell)
-            f.write("\n")
+        f.write("".join(f"{cell}\n" for cell in df_mm_inputfile))
     return fp_mm_inputfile
 
 
@@ -60,27 +97,389 @@ def create_mm_command_args(cmdargs) -> str:
     return cmdargs
 
 
-@log(msg="Running MetaMap batch query")
-def run_batch_metamap_api(fp_mm_inputfile, cfg):
-    """This function calls the MetaMap API."""
+def get_mm_output_format(cfg) -> str:
+    """Returns configured MetaMap output format (JSONf, JSONn or MMI)"""
+
+    output_format = cfg.apis.metamap.api_settings.get("output_format") or "JSONf"
+    if output_format not in MM_OUTPUT_FLAGS:
+        raise ValueError(
+            f"Unknown MetaMap output_format '{output_format}' (use one of {list(MM_OUTPUT_FLAGS)})"
+        )
+    return output_format
+
+
+def create_mm_output_command_args(cmdargs, output_format: str) -> str:
+    """Creates MetaMap command arguments with the output flag for output_format (replacing any output flag in
+    cmdargs)"""
+
+    output_flags = {flag.split(" ")[0] for flag in MM_OUTPUT_FLAGS.values()}
+    cmdargs = {
+        key: value
+        for key, value in cmdargs.items()
+        if str(value).split(" ")[0] not in output_flags
+    }
+    return f"{create_mm_command_args(cmdargs)} {MM_OUTPUT_FLAGS[output_format]}"
+
+
+def create_mm_submission(cfg) -> Submission:
+    """Creates MetaMap batch Submission (without input file)"""
 
     inst = Submission(
         cfg.apis.metamap.user_info.email, cfg.apis.metamap.user_info.apiKey
     )
     cmd = cfg.apis.metamap.api_settings.cmd
-    cmdargs = create_mm_command_args(cfg.apis.metamap.api_settings.cmdargs)
-    inst.set_serviceurl(cfg.apis.metamap.api_settings.serviceurl)
+    cmdargs = create_mm_output_command_args(
+        cfg.apis.metamap.api_settings.cmdargs, get_mm_output_format(cfg)
+    )
+    inst.set_casserverurl(
+        cfg.apis.metamap.api_settings.get("casserverurl") or CAS_SERVERURL
+    )
     inst.init_generic_batch(cfg.apis.metamap.api_settings.cmd, unescape_string(cmdargs))
-    inst.set_batch_file(fp_mm_inputfile)
+    inst.set_serviceurl(
+        cfg.apis.metamap.api_settings.serviceurl
+    )  # after init_generic_batch, which resets it to the default batch URL
     inst.form["SingLinePMID"] = "yes"
     inst.form["Batch_Command"] = "{} {}".format(cmd, unescape_string(cmdargs))
-    mm_logger.info("MetaMap Batch in progress...")  # TODO: put in progress bar here
+    return inst
+
+
+@log(msg="Running MetaMap batch query")
+def run_batch_metamap_api(fp_mm_inputfile, cfg):
+    """This function calls the MetaMap API."""
+
+    inst = create_mm_submission(cfg)
+    inst.set_batch_file(fp_mm_inputfile)
+    mm_logger.info("MetaMap Batch in progress...")
     response = inst.submit()
     # print("response status: {}".format(response.status_code))
     # print("content: {}".format(response.content.decode()))
     return response
 
 
+def split_mm_inputfile(fp_mm_inputfile, chunk_size: int) -> list:
+    """Splits SingLinePMID input file into chunks of at most chunk_size lines"""
+
+    with open(fp_mm_inputfile) as f:
+        lines = [line for line in f.read().splitlines() if line.strip()]
+    chunk_size = max(int(chunk_size or len(lines) or 1), 1)
+    return [
+        "\n".join(lines[i : i + chunk_size]) + "\n"
+        for i in range(0, len(lines), chunk_size)
+    ]
+
+
+def submit_mm_chunk(chunk_text: str, chunk_name: str, fp_output, cfg):
+    """Submits one chunk of the MetaMap input file, streaming its output to fp_output and retrying on failure.
+    Returns fp_output or None."""
+
+    batch = cfg.apis.metamap.api_settings.batch
+    for attempt in range(batch.retries + 1):
+        try:
+            inst = create_mm_submission(cfg)
+            inst.set_batch_file(chunk_name, chunk_text)
+            response = inst.submit(stream=True)
+            if response.status_code == 200:
+                stream_mm_output_to_file(response, fp_output)
+                if get_mm_output_format(cfg) == "MMI":
+                    return fp_output  # fielded output has no closing bracket to check
+                if not mm_output_is_complete(fp_output):  # retry truncated responses
+                    raise ValueError(f"Truncated MetaMap output in {fp_output}")
+                return fp_output
+            error = f"status {response.status_code}: {response.text[:500]}"
+        except (requests.RequestException, ValueError) as e:
+            error = repr(e)  # includes truncated/undecodable output
+        mm_logger.warning(
+            f"MetaMap chunk {chunk_name} failed (attempt {attempt + 1}/{batch.retries + 1}): {error}"
+        )
+        if attempt < batch.retries:
+            time.sleep(batch.retry_delay * (attempt + 1))
+    return None
+
+
+@log(msg="Running chunked MetaMap batch queries")
+def run_chunked_batch_metamap_api(fp_mm_inputfile, cfg, dir_step1):
+    """Submits the MetaMap input file in concurrent chunks and returns {output file: chunk input text} for each
+    successful chunk in input order, and the saved input files of chunks that failed after retries
+    """
+
+    batch = cfg.apis.metamap.api_settings.batch
+    chunks = split_mm_inputfile(fp_mm_inputfile, batch.chunk_size)
+    extension = "txt" if get_mm_output_format(cfg) == "MMI" else "json"
+    suffix = ".gz" if batch.get("compress_output") else ""
+    dir_chunks = Path(dir_step1) / "metamap-search_chunks"
+    dir_chunks.mkdir(parents=True, exist_ok=True)
+    chunk_names = [
+        f"{Path(fp_mm_inputfile).stem}_chunk-{i + 1:04d}.txt"
+        for i in range(len(chunks))
+    ]
+    mm_logger.info(
+        f"MetaMap Batch in progress: {len(chunks)} chunk(s) of up to {batch.chunk_size} lines, {batch.max_workers} in flight..."
+    )
+    with ThreadPoolExecutor(max_workers=max(int(batch.max_workers), 1)) as executor:
+        futures = [
+            executor.submit(
+                submit_mm_chunk,
+                chunk_text,
+                chunk_name,
+                dir_chunks / f"{Path(chunk_name).stem}_output.{extension}{suffix}",
+                cfg,
+            )
+            for chunk_text, chunk_name in zip(chunks, chunk_names)
+        ]
+        fps_output = [
+            future.result()
+            for future in tqdm(futures, total=len(futures), desc="MetaMap chunks")
+        ]
+    failed = []
+    for chunk_text, chunk_name, fp_output in zip(chunks, chunk_names, fps_output):
+        if fp_output is None:
+            fp_failed = dir_chunks / chunk_name
+            fp_failed.write_text(chunk_text)  # keep input for rerunning the chunk
+            failed.append(str(fp_failed))
+    if failed:
+        mm_logger.error(
+            f"{len(failed)} of {len(chunks)} MetaMap chunk(s) failed after retries: {failed}"
+        )
+    fps_mm_output = {
+        fp_output: chunk_text
+        for chunk_text, fp_output in zip(chunks, fps_output)
+        if fp_output is not None
+    }
+    return fps_mm_output, failed
+
+
+def open_mm_output(fp_output, mode: str = "rt"):
+    """Opens MetaMap output file, gzip-compressed if it ends with .gz"""
+
+    if str(fp_output).endswith(".gz"):
+        return gzip.open(fp_output, mode, encoding=None if "b" in mode else "utf-8")
+    return open(fp_output, mode, encoding=None if "b" in mode else "utf-8")
+
+
+def stream_mm_output_to_file(response, fp_output, chunk_size: int = 1 << 20):
+    """Writes MetaMap response body to disk as it arrives (gzip-compressed if fp_output ends with .gz)"""
+
+    with open_mm_output(fp_output, "wb") as f:
+        for block in response.iter_content(chunk_size=chunk_size):
+            f.write(block)
+    return fp_output
+
+
+def mm_output_is_complete(fp_output, tail_size: int = 256) -> bool:
+    """Checks that a MetaMap json output file ends with the closing ']}' of AllDocuments (whitespace allowed) without parsing it
+    (gzip-compressed files are decompressed, but not parsed, to reach the end)"""
+
+    if str(fp_output).endswith(".gz"):
+        tail = b""
+        with open_mm_output(fp_output, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                tail = (tail + block)[-tail_size:]
+    else:
+        with open(fp_output, "rb") as f:
+            f.seek(0, 2)
+            f.seek(max(f.tell() - tail_size, 0))
+            tail = f.read()
+    tail = tail.replace(NOT_DONE_LOOP.encode(), b"")
+    return re.search(rb"\]\s*\}\s*$", tail) is not None  # JSONf is pretty-printed
+
+
+def iter_mm_documents(fp_output, read_size: int = 1 << 20):
+    """Incrementally parses a MetaMap json output file, yielding one AllDocuments document at a time.
+    'NOT DONE LOOP' markers are removed as the file is read, including ones split across reads.
+    """
+
+    decoder = json.JSONDecoder()
+    keep = len(NOT_DONE_LOOP) - 1
+    with open_mm_output(fp_output, "rt") as f:
+        pending = ""
+
+        def read_more():
+            nonlocal pending
+            text = f.read(read_size)
+            if not text:
+                text, pending = pending, ""
+                return text, True
+            text = (pending + text).replace(NOT_DONE_LOOP, "")
+            text, pending = text[:-keep], text[-keep:]
+            return text, False
+
+        buffer, eof = "", False
+        while True:  # find the opening bracket of AllDocuments
+            start = buffer.find('"AllDocuments"')
+            pos = buffer.find("[", start) if start >= 0 else -1
+            if pos >= 0:
+                pos += 1
+                break
+            if eof:
+                raise ValueError(f"AllDocuments not found in {fp_output}")
+            text, eof = read_more()
+            buffer += text
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                if pos >= len(buffer):
+                    raise ValueError(f"Unterminated AllDocuments in {fp_output}")
+                doc, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:  # JSONDecodeError is a ValueError
+                if eof:
+                    raise
+                buffer, pos = buffer[pos:], 0  # document continues in the next read
+                text, eof = read_more()
+                buffer += text
+                continue
+            yield doc
+            if pos > read_size:
+                buffer, pos = buffer[pos:], 0
+
+
+def iter_mm_output_documents(fps_output):
+    """Yields MetaMap documents from several output files in order"""
+
+    for fp_output in fps_output:
+        yield from iter_mm_documents(fp_output)
+
+
+def configure_mm_cache(cfg):
+    """Opens (or reuses) the MetaMap result cache configured in metamap.api_settings.cache, or None if disabled"""
+
+    global mm_cache
+    cache_settings = cfg.apis.metamap.api_settings.get("cache")
+    if not cache_settings or not cache_settings.enabled:
+        mm_cache = None
+        return mm_cache
+    fp_cache = Path(
+        cache_settings.filepath or DEFAULT_CACHE_DIR.joinpath("metamap_cache.sqlite")
+    )
+    if mm_cache is None or mm_cache.filepath != fp_cache:
+        mm_cache = SQLiteCache(
+            fp_cache,
+            ttl_seconds=cache_settings.ttl_days * 24 * 60 * 60
+            if cache_settings.ttl_days
+            else None,
+            max_entries=cache_settings.max_entries,
+        )
+    mm_logger.info(
+        f"Using MetaMap result cache: {mm_cache.filepath} ({len(mm_cache)} entries)"
+    )
+    return mm_cache
+
+
+def mm_cache_key(text: str, cfg) -> str:
+    """Hash of input text, MetaMap command and arguments (including output flag and -Z/-V knowledge source)"""
+
+    api_settings = cfg.apis.metamap.api_settings
+    cmdargs = create_mm_output_command_args(
+        api_settings.cmdargs, get_mm_output_format(cfg)
+    )
+    key = json.dumps([text, api_settings.cmd, unescape_string(cmdargs)])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+@log(msg="Running MetaMap batch queries for lines missing from the MetaMap cache")
+def run_cached_batch_metamap_api(fp_mm_inputfile, cfg, dir_step1):
+    """Returns results dataframe for the MetaMap input file, submitting only lines whose candidates are not
+    cached yet and merging cached and fresh candidates in input order. Returns None if there were no results.
+    Raises RuntimeError if any chunk failed after retries, once the completed lines are cached and saved.
+    """
+
+    cache = configure_mm_cache(cfg)
+    if cache is None:
+        fps_mm_output, failed = run_chunked_batch_metamap_api(
+            fp_mm_inputfile, cfg, dir_step1
+        )
+        df = None
+        if fps_mm_output:
+            df = save_mm_results(
+                process_mm_output_files(list(fps_mm_output), cfg), dir_step1
+            )
+        raise_failed_chunks(failed)
+        return df
+
+    columns = list(cfg.apis.metamap.output_settings.columns)
+    with open(fp_mm_inputfile) as f:
+        lines = [line for line in f.read().splitlines() if line.strip()]
+    line_order = {line.split("|", 1)[0]: i for i, line in enumerate(lines)}
+    keys = {line: mm_cache_key(line.split("|", 1)[-1], cfg) for line in lines}
+    cached, uncached = {}, []
+    for line in lines:
+        records = cache.get(keys[line])
+        if records is None:
+            uncached.append(line)
+        else:
+            cached[line.split("|", 1)[0]] = records
+    mm_logger.info(
+        f"MetaMap cache: {len(cached)} of {len(lines)} input lines cached, submitting {len(uncached)}."
+    )
+
+    ls_df, failed = [], []
+    if uncached:
+        fp_uncached = Path(dir_step1) / f"{Path(fp_mm_inputfile).stem}_uncached.txt"
+        fp_uncached.write_text("".join(f"{line}\n" for line in uncached))
+        fps_mm_output, failed = run_chunked_batch_metamap_api(
+            fp_uncached, cfg, dir_step1
+        )
+        if fps_mm_output:
+            df_fresh = process_mm_output_files(list(fps_mm_output), cfg)
+            fresh = {
+                pmid: df_pmid[columns].to_dict("records")
+                for pmid, df_pmid in df_fresh.groupby("PMID", sort=False)
+            }
+            completed = [
+                line
+                for chunk_text in fps_mm_output.values()
+                for line in chunk_text.splitlines()
+            ]  # lines of failed chunks are not cached
+            cache.set_many(
+                (keys[line], fresh.get(line.split("|", 1)[0], [])) for line in completed
+            )  # lines without candidates are cached as empty
+            ls_df.append(df_fresh)
+    if cached:
+        values = {col: [] for col in ["PMID"] + columns}
+        for pmid, records in cached.items():
+            for record in records:
+                values["PMID"].append(pmid)
+                for col in columns:
+                    values[col].append(record.get(col))
+        ls_df.append(
+            mm_candidate_columns_to_df(
+                values, ascending=get_mm_output_format(cfg) != "MMI"
+            )
+        )
+    df = None
+    if ls_df:
+        df = pd.concat(ls_df, ignore_index=True).sort_values(
+            "PMID",
+            key=lambda pmids: pmids.map(line_order),
+            kind="stable",
+            na_position="last",
+        )  # back to input order (PMIDs not in the input file last)
+        df = save_mm_results(df.reset_index(drop=True), dir_step1)
+    raise_failed_chunks(failed)
+    return df
+
+
+def raise_failed_chunks(failed: list) -> None:
+    """Raises once completed chunks are saved, so an incomplete output is never mistaken for a full run"""
+
+    if failed:
+        raise RuntimeError(
+            f"{len(failed)} MetaMap chunk(s) failed after retries, metamap-search_output.csv only holds the "
+            f"completed lines. Rerun to resubmit them (inputs kept in {failed})."
+        )
+
+
+def save_mm_results(df, dir_step1) -> pd.DataFrame:
+    """Saves the merged (cached and freshly submitted) MetaMap candidates of every input line to
+    metamap-search_output.csv; raw output of submitted lines stays in metamap-search_chunks
+    """
+
+    df.to_csv(Path(dir_step1) / "metamap-search_output.csv", index=False)
+    return df
+
+
 @log(msg="Converting MetaMap output to JSON")
 def mm_output_to_json(response):
     """Decodes MetaMap output to JSON and removes 'NOT DONE LOOP' to process properly"""
@@ -112,32 +511,109 @@ def process_mm_json_to_df(mm_json, cfg) -> pd.DataFrame:
     #     with open(fp_json) as f:
     #         mm_json = json.load(f)
 
-    dict_docs = mm_json["AllDocuments"]
-    ls_df_maps = []
-    for doc in dict_docs:
-        pmid = doc["Document"]["Utterances"][0]["PMID"]
-        search_ID = int(pmid.split("_")[-1])  # get search_ID from PMID
-        df_temp = pd.json_normalize(
-            doc["Document"]["Utterances"][0]["Phrases"],
-            record_path=["Candidates"],
-            errors="ignore",
-        )
-        if df_temp.empty:
-            df_temp = pd.DataFrame(columns=cfg.apis.metamap.output_settings.columns)
-        df_temp.insert(0, "PMID", pmid)
-        df_temp.insert(1, "search_ID", search_ID)
-        df_temp.insert(2, "recCount", len(df_temp))
-        df_temp.insert(
-            3, "overall_rank", rank_CandidateScore(df_temp["CandidateScore"])
-        )
-        ls_df_maps.append(df_temp)
-    df = pd.concat(
-        ls_df_maps
-    )  # combine separate dataframes for each PMID into one dataframe
-
+    return process_mm_documents_to_df(mm_json["AllDocuments"], cfg)
+
+
+def extract_mm_candidate_columns(documents, columns) -> dict:
+    """Walks every utterance/phrase/candidate of MetaMap documents once and returns {column: list of values}
+    with PMID plus the requested candidate columns"""
+
+    pmids = []
+    values = {col: [] for col in columns}
+    appenders = [(col, values[col].append) for col in columns]
+    for doc in documents:
+        for utterance in doc["Document"]["Utterances"]:
+            pmid = utterance["PMID"]
+            for phrase in utterance["Phrases"]:
+                for candidate in phrase.get("Candidates", []):
+                    pmids.append(pmid)
+                    for col, append in appenders:
+                        append(candidate.get(col))
+    return {"PMID": pmids, **values}
+
+
+@log(msg="Processing MetaMap documents to dataframe")
+def process_mm_documents_to_df(documents, cfg) -> pd.DataFrame:
+    """Builds results dataframe from an iterable of MetaMap documents (e.g., streamed from output files)"""
+
+    columns = list(cfg.apis.metamap.output_settings.columns)
+    return mm_candidate_columns_to_df(
+        extract_mm_candidate_columns(documents, columns), ascending=True
+    )  # same as rank_CandidateScore within each PMID (MetaMap scores are negative)
+
+
+def mm_candidate_columns_to_df(values: dict, ascending: bool) -> pd.DataFrame:
+    """Builds results dataframe from {column: list of values} adding search_ID (from PMID), recCount and a dense
+    overall_rank of CandidateScore within each PMID"""
+
+    df = pd.DataFrame(values)
+    pmid = df["PMID"].astype(str)
+    df.insert(1, "search_ID", pmid.str.rsplit("_", n=1).str[-1].astype(int))
+    df.insert(2, "recCount", pmid.groupby(pmid).transform("size").astype(int))
+    df.insert(
+        3,
+        "overall_rank",
+        pd.to_numeric(df["CandidateScore"])
+        .groupby(pmid)
+        .rank(method="dense", ascending=ascending)
+        .astype(int),
+    )
     return df
 
 
+def extract_mmi_candidate_columns(lines, columns) -> dict:
+    """Parses fielded MMI lines (PMID|MMI|score|preferred name|CUI|[semtypes]|[triggers]|location|positions|treecodes)
+    into {column: list of values}. Columns MMI does not provide (e.g., Sources, MatchMaps) are left empty.
+    """
+
+    values = {col: [] for col in ["PMID"] + list(columns)}
+    for line in lines:
+        fields = line.rstrip("\r\n").split("|")
+        if len(fields) < 7 or fields[1] != "MMI":
+            continue  # skip AA (abbreviation) lines and anything that isn't a candidate
+        triggers = MMI_TRIGGER.findall(fields[6])  # [(matched text, negated), ...]
+        parsed = {
+            "PMID": fields[0],
+            "CandidateScore": fields[2],
+            "CandidatePreferred": fields[3],
+            "CandidateCUI": fields[4],
+            "SemTypes": [st for st in fields[5].strip("[]").split(",") if st],
+            "CandidateMatched": triggers[0][0] if triggers else "",
+            "Negated": "1" if any(neg == "1" for _, neg in triggers) else "0",
+        }
+        for col, ls in values.items():
+            ls.append(parsed.get(col, ""))
+    return values
+
+
+def iter_mm_output_lines(fps_output):
+    """Yields lines from several MetaMap output files in order"""
+
+    for fp_output in fps_output:
+        with open_mm_output(fp_output, "rt") as f:
+            yield from f
+
+
+@log(msg="Processing MetaMap MMI output to dataframe")
+def process_mm_mmi_to_df(lines, cfg) -> pd.DataFrame:
+    """Builds results dataframe from fielded MMI output lines (higher MMI score ranks first)"""
+
+    columns = list(cfg.apis.metamap.output_settings.columns)
+    return mm_candidate_columns_to_df(
+        extract_mmi_candidate_columns(lines, columns), ascending=False
+    )
+
+
+@log(msg="Processing MetaMap output files to dataframe")
+def process_mm_output_files(fps_output, cfg) -> pd.DataFrame:
+    """Parses chunk output files in order with the parser for the output format (streamed from the chunk files in
+    metamap-search_chunks, not copied)"""
+
+    if get_mm_output_format(cfg) == "MMI":
+        return process_mm_mmi_to_df(iter_mm_output_lines(fps_output), cfg)
+    return process_mm_documents_to_df(iter_mm_output_documents(fps_output), cfg)
+
+
 def rank_CandidateScore(CandidateScore):
     """Turn CandidateScore into overall_rank"""
 
@@ -14,9 +14,11 @@ from ddcuimap.semantic_search import ss_logger, log, copy_log
 import ddcuimap.utils.helper as helper
 import ddcuimap.curation.utils.process_data_dictionary as proc_dd
 import ddcuimap.curation.utils.curation_functions as cur
+import ddcuimap.curation.utils.deduplication as dedup
 
 # Semantic Search with Pinecone
 from ddcuimap.semantic_search.utils.api_connection import (
+    LOCAL_BACKENDS,
     check_credentials,
     connect_to_pinecone,
 )
@@ -71,6 +73,9 @@ def run_hybrid_ss_batch(cfg, **kwargs):
         df_dd, df_dd_preprocessed, cfg.custom.settings.pipeline_name, cfg
     )
 
+    # DEDUPLICATE QUERY TERMS
+    df_curation_query, df_dedup_map = dedup.deduplicate_query_terms(df_curation, cfg)
+
     # BATCH EMBED QUERY TERMS
     if (
         cfg.semantic_search.query.filepath_embeddings
@@ -81,7 +86,7 @@ def run_hybrid_ss_batch(cfg, **kwargs):
         )
     else:
         builders.check_set_device(cfg.semantic_search)
-        df_query_embeddings = df_curation.pipe(  # df_curation.copy() will leave embeddings out of df_curation and df_final
+        df_query_embeddings = df_curation_query.pipe(  # df_curation.copy() will leave embeddings out of df_curation and df_final
             builders.hybrid_builder,
             embed_columns=cfg.semantic_search.query.embed_columns,
             dense_model_id=cfg.semantic_search.query.embed.dense.model_name,
@@ -98,11 +103,14 @@ def run_hybrid_ss_batch(cfg, **kwargs):
         cfg.semantic_search.query.filepath_embeddings = fp_embeddings
 
     # RETRIEVE UMLS VECTOR ID AS DICTIONARY
-    ids = importlib.resources.read_binary(
-        "ddcuimap.semantic_search.resources", "dict_umls_upsert_ids.pkl"
-    )
-    dict_umls_upsert_ids = pickle.loads(ids)
-    # dict_umls_upsert_ids = run.fetch_id_metadata(index, cfg) #TODO: need to work on this
+    if cfg.apis.pinecone.index_info.backend in LOCAL_BACKENDS:
+        dict_umls_upsert_ids = run.fetch_id_metadata(index, cfg)
+    else:
+        ids = importlib.resources.read_binary(
+            "ddcuimap.semantic_search.resources", "dict_umls_upsert_ids.pkl"
+        )
+        dict_umls_upsert_ids = pickle.loads(ids)
+        # dict_umls_upsert_ids = run.fetch_id_metadata(index, cfg) #TODO: need to work on this
 
     # RUN BATCH QUERY
     ls_df_alphas = []
@@ -112,7 +120,7 @@ def run_hybrid_ss_batch(cfg, **kwargs):
     for alpha in alphas:
         pipeline_name_alpha = f"hybrid_semantic_search (custom={cfg.custom.settings.custom_config}, alpha={alpha})"
         cfg.semantic_search.query.alpha = alpha
-        var_results = run.hybrid_search_runner(df_query_embeddings, alpha, cfg)
+        var_results = run.hybrid_search_runner(index, df_query_embeddings, alpha, cfg)
         # AGGREGATE AND RANK RESULTS
         df_agg = run.aggregate_results(var_results, dict_umls_upsert_ids, cfg)
         df_agg = df_agg.rename(
@@ -124,6 +132,7 @@ def run_hybrid_ss_batch(cfg, **kwargs):
         )
         df_agg.insert(2, "recCount", cfg.semantic_search.query.top_k)
         df_agg.insert(1, "pipeline_name_alpha", pipeline_name_alpha)
+        df_agg = dedup.fan_out_results(df_agg, df_dedup_map, cfg)
         ls_df_alphas.append(df_agg)
     df_results = pd.concat(ls_df_alphas, axis=0)
 
@@ -16,6 +16,18 @@ from ddcuimap.semantic_search.utils.api_connection import (
     connect_to_pinecone,
 )
 
+METADATA_COLUMNS = [
+    "STR_tokens",
+    "DEF_tokens",
+    "CUI",
+    "STR",
+    "SAB_MRDEF",
+    "SAB_CUI_DEF_all",
+    "SAB_MRCONSO",
+    "SAB_CUI_CONSO_all",
+    "STY",
+]
+
 cfg = helper.compose_config(
     config_path="../configs",
     overrides=["semantic_search=embeddings", "apis=config_pinecone_api"],
@@ -49,6 +61,24 @@ def upsert_umls(cfg, **kwargs):
         f"Pinecone indexes available: {pinecone.list_indexes()}"
     )  # List all indexes currently present for your key
 
+    # BUILD MEMORY-MAPPED INDEX INSTEAD OF UPSERTING
+    if cfg.apis.pinecone.index_info.backend in ["exact", "hnsw", "inverted"]:
+        index = pinecone.build_index(
+            name=cfg.semantic_search.pinecone.index.index_name,
+            df_embeddings=df_umls_embeddings,
+            embed_columns=cfg.semantic_search.upsert.embed_columns,
+            metadata_columns=METADATA_COLUMNS,
+            dimension=cfg.semantic_search.pinecone.index.dimension,
+            metric=cfg.semantic_search.pinecone.index.metric,
+        )
+        ss_logger.info(f"Index size: {index.describe_index_stats()}")
+        helper.save_config(
+            cfg,
+            Path(cfg.semantic_search.upsert.filepath_processed).parent,
+            "config_upsert.yaml",
+        )
+        return index, cfg
+
     # CHECK WHETHER THE INDEX WITH THE SAME NAME ALREADY EXISTS
     if cfg.semantic_search.pinecone.index.index_name not in pinecone.list_indexes():
         pinecone.create_index(
@@ -77,23 +107,16 @@ def upsert_umls(cfg, **kwargs):
                         "values": batch_df[f"{col}_dense_vecs"].iloc[i],
                         "sparse_values": batch_df[f"{col}_sparse_vecs_upsert"].iloc[i],
                         "metadata": {
-                            "STR_tokens": batch_df.STR_tokens.iloc[i],
-                            "DEF_tokens": batch_df.DEF_tokens.iloc[i],
-                            "CUI": batch_df.CUI.iloc[i],
-                            "STR": batch_df.STR.iloc[i],
-                            "SAB_MRDEF": batch_df.SAB_MRDEF.iloc[i],
-                            "SAB_CUI_DEF_all": batch_df.SAB_CUI_DEF_all.iloc[i],
-                            "SAB_MRCONSO": batch_df.SAB_MRCONSO.iloc[i],
-                            "SAB_CUI_CONSO_all": batch_df.SAB_CUI_CONSO_all.iloc[i],
-                            "STY": batch_df.STY.iloc[i],
+                            name: batch_df[name].iloc[i] for name in METADATA_COLUMNS
                         },
                     }
                 )
             index.upsert(vectors=vectors, namespace=col)
 
     # CHECK INDEX SIZE FOR EACH NAMESPACE
-    ss_logger.info("Index size after upsert:")
-    index.describe_index_stats()
+    ss_logger.info(f"Index size after upsert: {index.describe_index_stats()}")
+    if cfg.apis.pinecone.index_info.backend == "local":
+        index.save()  # persist so query pipelines can load it
 
     # SAVE CONFIG
     helper.save_config(
@@ -7,12 +7,23 @@ load_dotenv()
 import pinecone
 
 from ddcuimap.semantic_search import ss_logger, log
+from ddcuimap.semantic_search.utils.local_pinecone import LocalPinecone
+from ddcuimap.semantic_search.utils.exact_search import ExactHybridStore
+from ddcuimap.semantic_search.utils.hnsw_search import HNSWHybridStore
+from ddcuimap.semantic_search.utils.sparse_search import InvertedHybridStore
+
+LOCAL_BACKENDS = ["local", "exact", "hnsw", "inverted"]  # need no Pinecone credentials
 
 
 @log(msg="Checking Pinecone credentials in config files or .env file")
 def check_credentials(cfg):
     """Checks if api credentials exist in initialized config file or alternatively in an .env file"""
 
+    if cfg.apis.pinecone.index_info.backend in LOCAL_BACKENDS:
+        ss_logger.info(
+            f"Using {cfg.apis.pinecone.index_info.backend} backend. No credentials needed."
+        )
+        return cfg
     if not cfg.apis.pinecone.index_info.apiKey:
         ss_logger.warning("No apiKey found in config files. Looking in .env file.")
         try:
@@ -41,7 +52,46 @@ def check_credentials(cfg):
 
 @log(msg="Connecting to Pinecone index")
 def connect_to_pinecone(cfg):
-    """Connects to Pinecone API and print index info"""
+    """Connects to Pinecone API (or a local backend) and print index info"""
+
+    index_info = cfg.apis.pinecone.index_info
+    if index_info.backend == "local":
+        local_pinecone = LocalPinecone(
+            dirpath=index_info.local.dirpath,
+            latency=index_info.local.latency,
+            throttle_rate=index_info.local.throttle_rate,
+        )
+        ss_logger.info(f"Using local Pinecone backend in {local_pinecone.dirpath}")
+        return local_pinecone
+    if index_info.backend == "exact":
+        exact_store = ExactHybridStore(
+            dirpath=index_info.exact.dirpath,
+            query_batch_size=index_info.exact.query_batch_size,
+        )
+        ss_logger.info(f"Using exact hybrid search backend in {exact_store.dirpath}")
+        return exact_store
+    if index_info.backend == "hnsw":
+        hnsw_store = HNSWHybridStore(
+            dirpath=index_info.hnsw.dirpath,
+            M=index_info.hnsw.M,
+            ef_construction=index_info.hnsw.ef_construction,
+            ef_search=index_info.hnsw.ef_search,
+            hybrid_candidates=index_info.hnsw.hybrid_candidates,
+            num_threads=index_info.hnsw.num_threads,
+            query_batch_size=index_info.hnsw.query_batch_size,
+        )
+        ss_logger.info(f"Using HNSW hybrid search backend in {hnsw_store.dirpath}")
+        return hnsw_store
+    if index_info.backend == "inverted":
+        inverted_store = InvertedHybridStore(
+            dirpath=index_info.inverted.dirpath,
+            pruning=index_info.inverted.pruning,
+            query_batch_size=index_info.inverted.query_batch_size,
+        )
+        ss_logger.info(
+            f"Using inverted hybrid search backend in {inverted_store.dirpath}"
+        )
+        return inverted_store
 
     pinecone.init(
         api_key=cfg.apis.pinecone.index_info.apiKey,
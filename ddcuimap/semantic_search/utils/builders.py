@@ -4,15 +4,14 @@ Functions to assist with tokenizing, embedding, and formatting data for upsert i
 
 """
 
+import numpy as np
 from sentence_transformers import SentenceTransformer
 from splade.models.transformer_rep import Splade
 from transformers import AutoTokenizer
 import torch
 
 from ddcuimap.semantic_search import ss_logger, log
-from ddcuimap.semantic_search.utils.checks import (
-    normalize_unit_length,
-)
+from ddcuimap.semantic_search.utils.embedding_cache import open_embedding_caches
 
 
 @log(msg="Checking/Setting Device for embedding")
@@ -73,6 +72,60 @@ def tokenize_columns(df, columns, model_name):
     return df
 
 
+def sparse_nonzeros_to_upsert(rows, indices, values, n_rows: int, normalize: bool):
+    """Sparse_values dicts (sorted by value, then index, descending) from the row-major nonzeros of SPLADE vectors"""
+
+    ends = np.cumsum(np.bincount(rows, minlength=n_rows))
+    if normalize:
+        values = values.astype(np.float64)
+        values = (
+            values / np.sqrt(np.bincount(rows, values**2, minlength=n_rows))[rows]
+        )
+    order = np.lexsort((-indices, -values, rows))
+    return [
+        {"indices": vec_indices.tolist(), "values": vec_values.tolist()}
+        for vec_indices, vec_values in zip(
+            np.split(indices[order], ends[:-1]), np.split(values[order], ends[:-1])
+        )
+    ]
+
+
+def encode_sparse(texts, tokenizer, sparse_model, sparse_batch_size, cfg):
+    """SPLADE sparse vectors ({"indices": [...], "values": [...]} sorted by weight) for a list of texts"""
+
+    if not texts:
+        return []
+    # TOKENIZE ONCE AND BATCH BY TOKEN LENGTH TO MINIMIZE PADDING
+    encodings = tokenizer(texts, truncation=True)
+    lengths = [len(input_ids) for input_ids in encodings["input_ids"]]
+    order = np.argsort(lengths, kind="stable")
+    sparse_upsert = [None] * len(texts)
+    for i in range(0, len(texts), sparse_batch_size):
+        ss_logger.info(f"Embedding {i} to {i + sparse_batch_size}")
+        batch_rows = order[i : i + sparse_batch_size]
+        input_ids = tokenizer.pad(
+            {key: [encodings[key][r] for r in batch_rows] for key in encodings.keys()},
+            return_tensors="pt",
+        )
+        with torch.no_grad():
+            sparse_vecs = sparse_model(
+                d_kwargs=input_ids.to(cfg.semantic_search_settings.device)
+            )["d_rep"].reshape(len(batch_rows), -1)
+        # EXTRACT NONZEROS OF THE WHOLE BATCH, THEN NORMALIZE AND SORT PER ROW IN NUMPY
+        rows, indices = sparse_vecs.nonzero(as_tuple=True)
+        values = sparse_vecs[rows, indices].cpu().numpy()
+        batch_upsert = sparse_nonzeros_to_upsert(
+            rows.cpu().numpy(),
+            indices.cpu().numpy(),
+            values,
+            len(batch_rows),
+            cfg.upsert.embed.sparse.normalize,
+        )
+        for row, sparse_values in zip(batch_rows, batch_upsert):
+            sparse_upsert[row] = sparse_values
+    return sparse_upsert
+
+
 @log(
     msg="Building dense and sparse embeddings and adding metadata for upsert into Pinecone"
 )
@@ -81,54 +134,71 @@ def hybrid_builder(
 ):
     """Builds dense and sparse embeddings and adds metadata for upserting into Pinecone for hybrid semantic search"""
 
-    dense_model = SentenceTransformer(
-        dense_model_id, device=cfg.semantic_search_settings.device
-    )
-
+    # models are loaded on the first text missing from the embedding cache
+    dense_model = sparse_model = None
     tokenizer = AutoTokenizer.from_pretrained(sparse_model_id)
-    sparse_model = Splade(sparse_model_id, agg="max")
-    sparse_model.to(cfg.semantic_search_settings.device)  # move to GPU if possible
-    idx2token = {idx: token for token, idx in tokenizer.get_vocab().items()}
+    # token-string columns are only decoded when configured (they are for inspection only)
+    idx2token = None
+    if cfg.upsert.embed.sparse.get("idx2token", False):
+        idx2token = {idx: token for token, idx in tokenizer.get_vocab().items()}
+    dense_cache, sparse_cache = open_embedding_caches(
+        cfg, dense_model_id, sparse_model_id
+    )
     for col in embed_columns:
         ss_logger.info(f"Embedding {col}")
         batch = df[col].values.tolist()
-        dense_vecs = dense_model.encode(
-            batch,
-            show_progress_bar=True,
-            normalize_embeddings=cfg.upsert.embed.dense.normalize,
-        )
+
+        # DENSE EMBEDDINGS
+        if dense_cache is None:
+            texts = batch
+        else:
+            texts = dense_cache.missing(batch)
+            ss_logger.info(f"{len(texts)} {col} texts not in dense embedding cache")
+        if texts or dense_cache is None:
+            if dense_model is None:
+                dense_model = SentenceTransformer(
+                    dense_model_id, device=cfg.semantic_search_settings.device
+                )
+            dense_vecs = dense_model.encode(
+                texts,
+                show_progress_bar=True,
+                normalize_embeddings=cfg.upsert.embed.dense.normalize,
+            )
+            if dense_cache is not None:
+                dense_cache.put(texts, dense_vecs)
+        if dense_cache is not None:
+            dense_vecs = dense_cache.get(batch)
         df[f"{col}_dense_vecs"] = dense_vecs.tolist()
-        sparse_upsert = []
-        sparse_idx2token = []
-        for i in range(0, len(batch), sparse_batch_size):
-            ss_logger.info(f"Embedding {i} to {i + sparse_batch_size}")
-            batch_splade = batch[i : i + sparse_batch_size]
-            input_ids = tokenizer(
-                batch_splade, return_tensors="pt", padding=True, truncation=True
+
+        # SPARSE EMBEDDINGS
+        if sparse_cache is None:
+            texts = batch
+        else:
+            texts = sparse_cache.missing(batch)
+            ss_logger.info(f"{len(texts)} {col} texts not in sparse embedding cache")
+        if texts or sparse_cache is None:
+            if sparse_model is None:
+                sparse_model = Splade(sparse_model_id, agg="max")
+                # move to GPU if possible
+                sparse_model.to(cfg.semantic_search_settings.device)
+            sparse_upsert = encode_sparse(
+                texts, tokenizer, sparse_model, sparse_batch_size, cfg
             )
-            with torch.no_grad():
-                sparse_vecs = sparse_model(
-                    d_kwargs=input_ids.to(cfg.semantic_search_settings.device)
-                )["d_rep"].squeeze()
-            for id, sparse_vec in enumerate(sparse_vecs):
-                indices = sparse_vec.nonzero().squeeze().cpu().tolist()  # positions
-                values = sparse_vec[indices].cpu().tolist()  # weights/scores
-                if cfg.upsert.embed.sparse.normalize:
-                    values = normalize_unit_length(values)
-                values, indices = zip(
-                    *[(x, y) for x, y in sorted(zip(values, indices), reverse=True)]
-                )
-                values = list(values)
-                indices = list(indices)
-                sparse_dict = {
+            if sparse_cache is not None:
+                sparse_cache.put(texts, sparse_upsert)
+        if sparse_cache is not None:
+            sparse_upsert = sparse_cache.get(batch)
+        df[f"{col}_sparse_vecs_upsert"] = sparse_upsert
+        if idx2token is not None:
+            df[f"{col}_sparse_vecs_idx2token"] = [
+                {
                     idx2token[idx]: round(weight, 2)
-                    for idx, weight in zip(indices, values)
+                    for idx, weight in zip(
+                        sparse_values["indices"], sparse_values["values"]
+                    )
                 }
-                sparse_values = {"indices": indices, "values": values}
-                sparse_upsert.append(sparse_values)
-                sparse_idx2token.append(sparse_dict)
-        df[f"{col}_sparse_vecs_upsert"] = sparse_upsert
-        df[f"{col}_sparse_vecs_idx2token"] = sparse_idx2token
+                for sparse_values in sparse_upsert
+            ]
     return df
 
 
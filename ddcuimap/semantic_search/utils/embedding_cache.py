@@ -0,0 +1,215 @@
+"""
+
+Persistent, content-addressed cache of the dense and SPLADE embeddings built by builders.hybrid_builder.
+
+Each (model name, normalize flag) pair gets its own folder of append-only files: a sha1 digest per embedded text
+(keys.bin) and the vectors in the same row order, float32 dense rows (dense.f32) or concatenated sparse indices/values
+with per-row end offsets (indices.i32, values.f32, ends.i64). Rows are read back through np.memmap, so only the rows
+of a run's texts are loaded. Vectors are written before their keys, and rows without a key (e.g. from an interrupted
+run) are truncated on open. Embeddings of texts seen in any earlier run (data dictionaries or UMLS subsets) are reused,
+so only new or changed texts are encoded. Configure it with:
+
+    semantic_search.embedding_cache.enabled=true
+    semantic_search.embedding_cache.dirpath=path/to/embeddings
+
+"""
+
+import abc
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from ddcuimap.semantic_search import ss_logger
+from ddcuimap.utils.sqlite_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_DIRPATH = DEFAULT_CACHE_DIR / "embeddings"
+DIGEST_SIZE = 20  # sha1
+
+
+def text_key(text) -> bytes:
+    return hashlib.sha1(str(text).encode("utf-8")).digest()
+
+
+class EmbeddingCache(abc.ABC):
+    """Models the append-only embeddings of one model and normalize flag, looked up by text hash."""
+
+    kind = None
+    files = {}  # name -> dtype of the files holding the vectors
+
+    def __init__(self, dirpath, model_name, normalize) -> None:
+        settings = {
+            "kind": self.kind,
+            "model_name": model_name,
+            "normalize": bool(normalize),
+        }
+        folder = hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+        self.dirpath = Path(dirpath or DEFAULT_DIRPATH) / f"{self.kind}_{folder[:16]}"
+        self.dirpath.mkdir(parents=True, exist_ok=True)
+        fp_settings = self.dirpath / "settings.json"
+        if not fp_settings.exists():
+            fp_settings.write_text(json.dumps(settings, indent=2))
+        self.fp_keys = self.dirpath / "keys.bin"
+        self.fp_keys.touch()
+        for name in self.files:
+            (self.dirpath / name).touch()
+        keys = self.fp_keys.read_bytes()
+        n_rows = len(keys) // DIGEST_SIZE
+        self.rows = {
+            keys[i * DIGEST_SIZE : (i + 1) * DIGEST_SIZE]: i for i in range(n_rows)
+        }
+        self.truncate(n_rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def array(self, name) -> np.ndarray:
+        """Memory-mapped vector file (empty array when nothing is stored yet)"""
+
+        fp = self.dirpath / name
+        if not fp.stat().st_size:
+            return np.zeros(0, dtype=self.files[name])
+        return np.memmap(fp, dtype=self.files[name], mode="r")
+
+    @abc.abstractmethod
+    def n_items(self, n_rows: int) -> dict:
+        """Number of items each vector file holds for the first n_rows rows"""
+
+    def truncate(self, n_rows: int) -> None:
+        """Drops keys and vectors past the last row whose key was written"""
+
+        with open(self.fp_keys, "r+b") as f:
+            f.truncate(n_rows * DIGEST_SIZE)
+        for name, n_items in self.n_items(n_rows).items():
+            fp = self.dirpath / name
+            size = n_items * np.dtype(self.files[name]).itemsize
+            if fp.stat().st_size > size:
+                ss_logger.warning(f"Truncating unkeyed rows from {fp}")
+                with open(fp, "r+b") as f:
+                    f.truncate(size)
+
+    def missing(self, texts) -> list:
+        """Unique texts (in first-seen order) that have no cached vector"""
+
+        return list(dict.fromkeys(t for t in texts if text_key(t) not in self.rows))
+
+    def append(self, texts, arrays: dict) -> None:
+        """Appends vector arrays for texts, then their keys"""
+
+        for name, values in arrays.items():
+            with open(self.dirpath / name, "ab") as f:
+                f.write(np.ascontiguousarray(values, dtype=self.files[name]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        keys = [text_key(t) for t in texts]
+        with open(self.fp_keys, "ab") as f:
+            f.write(b"".join(keys))
+        for key in keys:
+            self.rows[key] = len(self.rows)
+
+    def row_ids(self, texts) -> np.ndarray:
+        return np.fromiter((self.rows[text_key(t)] for t in texts), dtype=np.int64)
+
+
+class DenseEmbeddingCache(EmbeddingCache):
+    """Float32 dense vectors, one fixed-width row per text."""
+
+    kind = "dense"
+    files = {"dense.f32": np.float32}
+
+    def n_items(self, n_rows: int) -> dict:
+        return {"dense.f32": n_rows * self.dimension()}
+
+    def dimension(self) -> int:
+        return json.loads((self.dirpath / "settings.json").read_text()).get(
+            "dimension", 0
+        )
+
+    def put(self, texts, dense_vecs) -> None:
+        if not len(texts):
+            return
+        dense_vecs = np.asarray(dense_vecs, dtype=np.float32)
+        if not self.dimension():
+            fp_settings = self.dirpath / "settings.json"
+            settings = json.loads(fp_settings.read_text())
+            settings["dimension"] = dense_vecs.shape[1]
+            fp_settings.write_text(json.dumps(settings, indent=2))
+        elif dense_vecs.shape[1] != self.dimension():
+            raise ValueError(
+                f"Dense vectors have dimension {dense_vecs.shape[1]}, cache {self.dirpath} holds {self.dimension()}"
+            )
+        self.append(texts, {"dense.f32": dense_vecs})
+
+    def get(self, texts) -> np.ndarray:
+        """Float32 matrix with the cached vector of each text"""
+
+        matrix = self.array("dense.f32").reshape(-1, max(self.dimension(), 1))
+        return np.asarray(matrix[self.row_ids(texts)])
+
+
+class SparseEmbeddingCache(EmbeddingCache):
+    """SPLADE vectors as concatenated int32 indices and float32 values with int64 end offsets per text."""
+
+    kind = "sparse"
+    files = {"ends.i64": np.int64, "indices.i32": np.int32, "values.f32": np.float32}
+
+    def n_items(self, n_rows: int) -> dict:
+        ends = self.array("ends.i64")
+        nnz = int(ends[n_rows - 1]) if n_rows else 0
+        return {"ends.i64": n_rows, "indices.i32": nnz, "values.f32": nnz}
+
+    def put(self, texts, sparse_vecs) -> None:
+        if not len(texts):
+            return
+        ends = self.array("ends.i64")
+        offset = int(ends[len(self) - 1]) if len(self) else 0
+        lengths = [len(sv["indices"]) for sv in sparse_vecs]
+        self.append(
+            texts,
+            {
+                "indices.i32": np.concatenate(
+                    [np.asarray(sv["indices"], dtype=np.int32) for sv in sparse_vecs]
+                ),
+                "values.f32": np.concatenate(
+                    [np.asarray(sv["values"], dtype=np.float32) for sv in sparse_vecs]
+                ),
+                "ends.i64": offset + np.cumsum(lengths),
+            },
+        )
+
+    def get(self, texts) -> list:
+        """Pinecone sparse_values dict ({"indices": [...], "values": [...]}) of each text"""
+
+        ends = self.array("ends.i64")
+        indices, values = self.array("indices.i32"), self.array("values.f32")
+        ls_sparse = []
+        for row in self.row_ids(texts):
+            start = int(ends[row - 1]) if row else 0
+            ls_sparse.append(
+                {
+                    "indices": indices[start : ends[row]].tolist(),
+                    "values": values[start : ends[row]].tolist(),
+                }
+            )
+        return ls_sparse
+
+
+def open_embedding_caches(cfg, dense_model_id, sparse_model_id):
+    """Dense and sparse caches for the models and normalize flags hybrid_builder embeds with (None if disabled)"""
+
+    cache_cfg = cfg.get("embedding_cache")
+    if not cache_cfg or not cache_cfg.enabled:
+        return None, None
+    dense_cache = DenseEmbeddingCache(
+        cache_cfg.dirpath, dense_model_id, cfg.upsert.embed.dense.normalize
+    )
+    sparse_cache = SparseEmbeddingCache(
+        cache_cfg.dirpath, sparse_model_id, cfg.upsert.embed.sparse.normalize
+    )
+    ss_logger.info(
+        f"Using embedding cache in {Path(dense_cache.dirpath).parent}: "
+        f"{len(dense_cache)} dense and {len(sparse_cache)} sparse vectors"
+    )
+    return dense_cache, sparse_cache
@@ -0,0 +1,325 @@
+"""
+
+Exact local hybrid search over memory-mapped UMLS embeddings, an offline alternative to a Pinecone index.
+
+Each namespace (STR, DEF) is stored as a float32 dense matrix (np.memmap) plus its SPLADE vectors as CSR arrays
+(memory-mapped .npy), so loading is instant and only the pages touched while scoring are read. Queries are scored in
+batches with one BLAS matrix product and one sparse product per batch, and top-k is selected with argpartition.
+Scores equal a Pinecone dotproduct index: dense dot product plus sparse dot product, with the alpha weighting applied
+beforehand exactly as in runners.hybrid_scale. Select it with:
+
+    apis.pinecone.index_info.backend=exact
+    apis.pinecone.index_info.exact.dirpath=path/to/exact_index
+
+"""
+
+import json
+import pickle
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from ddcuimap.semantic_search import ss_logger, log
+from ddcuimap.semantic_search.utils.local_pinecone import LocalPineconeResponse
+from ddcuimap.utils.sqlite_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_DIRPATH = DEFAULT_CACHE_DIR / "exact_index"
+
+
+# VECTOR CONVERSIONS
+
+
+def sparse_vecs_to_csr(sparse_vecs, n_cols: int = None) -> sparse.csr_matrix:
+    """Stacks {"indices": [...], "values": [...]} dicts into a float32 CSR matrix (one row per vector)"""
+
+    lengths = [len(sv["indices"]) for sv in sparse_vecs]
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    nnz = int(indptr[-1])
+    indices = np.fromiter(
+        (i for sv in sparse_vecs for i in sv["indices"]), dtype=np.int64, count=nnz
+    )
+    data = np.fromiter(
+        (v for sv in sparse_vecs for v in sv["values"]), dtype=np.float32, count=nnz
+    )
+    if n_cols is None:
+        n_cols = int(indices.max()) + 1 if nnz else 0
+    elif nnz:  # drop query terms outside the index vocabulary (they score 0)
+        keep = indices < n_cols
+        if not keep.all():
+            rows = np.repeat(np.arange(len(lengths)), lengths)[keep]
+            indptr[1:] = np.cumsum(np.bincount(rows, minlength=len(lengths)))
+            indices, data = indices[keep], data[keep]
+    index_dtype = np.int32 if max(nnz, n_cols) < np.iinfo(np.int32).max else np.int64
+    return sparse.csr_matrix(
+        (data, indices.astype(index_dtype), indptr.astype(index_dtype)),
+        shape=(len(lengths), n_cols),
+    )
+
+
+def top_k_rows(scores: np.ndarray, top_k: int):
+    """Column indices and scores of the top_k highest scores per row, sorted descending (ties by column)"""
+
+    top_k = min(top_k, scores.shape[1])
+    if top_k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(scores.dtype)
+    top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    # ties at the k-th score (e.g. zero-score padding) go to the lowest columns, not argpartition's pick
+    kth = top_scores.min(axis=1, keepdims=True)
+    n_tied = (scores == kth).sum(axis=1)
+    for i in np.flatnonzero(n_tied > (top_scores == kth).sum(axis=1)):
+        above = np.flatnonzero(scores[i] > kth[i])
+        tied = np.flatnonzero(scores[i] == kth[i])[: top_k - len(above)]
+        top[i] = np.concatenate([above, tied])
+        top_scores[i] = scores[i, top[i]]
+    order = np.lexsort((top, -top_scores), axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(
+        top_scores, order, axis=1
+    )
+
+
+# ON-DISK MATRICES
+
+
+def save_dense_matrix(vecs, filepath) -> np.memmap:
+    """Writes row vectors to a raw float32 file and returns it memory-mapped"""
+
+    vecs = np.asarray(list(vecs), dtype=np.float32)
+    dense = np.memmap(filepath, dtype=np.float32, mode="w+", shape=vecs.shape)
+    dense[:] = vecs
+    dense.flush()
+    return dense
+
+
+def save_csr(matrix: sparse.csr_matrix, dirpath, prefix: str) -> None:
+    for name in ["data", "indices", "indptr"]:
+        np.save(Path(dirpath) / f"{prefix}_{name}.npy", getattr(matrix, name))
+
+
+def load_csr(dirpath, prefix: str, shape) -> sparse.csr_matrix:
+    """CSR matrix over memory-mapped data/indices/indptr arrays (no copy)"""
+
+    data, indices, indptr = [
+        np.load(Path(dirpath) / f"{prefix}_{name}.npy", mmap_mode="r")
+        for name in ["data", "indices", "indptr"]
+    ]
+    return sparse.csr_matrix((data, indices, indptr), shape=tuple(shape), copy=False)
+
+
+class ExactHybridIndex:
+    """Models a read-only hybrid index scored exactly over memory-mapped dense and sparse matrices."""
+
+    def __init__(self, dirpath, query_batch_size: int = 256) -> None:
+        self.dirpath = Path(dirpath)
+        with open(self.dirpath / "index.json") as f:
+            self.info = json.load(f)
+        with open(self.dirpath / "metadata.pkl", "rb") as f:
+            self.metadata = pickle.load(f)
+        self.query_batch_size = query_batch_size
+        self.dimension = self.info["dimension"]
+        self.namespaces = {}
+        for name, ns_info in self.info["namespaces"].items():
+            n_rows = ns_info["vector_count"]
+            ids = np.load(self.dirpath / f"{name}_ids.npy", allow_pickle=True)
+            dense = np.memmap(
+                self.dirpath / f"{name}_dense.f32",
+                dtype=np.float32,
+                mode="r",
+                shape=(n_rows, self.dimension),
+            )
+            sparse_matrix = load_csr(
+                self.dirpath, f"{name}_sparse", (n_rows, ns_info["vocab_size"])
+            )
+            self.namespaces[name] = {
+                "ids": ids,
+                "rows": {_id: row for row, _id in enumerate(ids)},
+                "dense": dense,
+                "sparse": sparse_matrix,
+            }
+
+    @classmethod
+    def build(
+        cls,
+        dirpath,
+        df_embeddings,
+        embed_columns,
+        metadata_columns,
+        dimension: int,
+        metric: str = "dotproduct",
+        query_batch_size: int = 256,
+    ) -> "ExactHybridIndex":
+        """Writes the {col}_dense_vecs/{col}_sparse_vecs_upsert columns of embed_umls output per namespace"""
+
+        if metric != "dotproduct":
+            raise ValueError(
+                "The exact hybrid index only supports the dotproduct metric"
+            )
+        dirpath = Path(dirpath)
+        dirpath.mkdir(parents=True, exist_ok=True)
+        ids = df_embeddings["vector_id"].astype(str).to_numpy(dtype=object)
+        info = {"dimension": int(dimension), "metric": metric, "namespaces": {}}
+        for col in embed_columns:
+            dense = save_dense_matrix(
+                df_embeddings[f"{col}_dense_vecs"], dirpath / f"{col}_dense.f32"
+            )
+            if dense.shape[1] != dimension:
+                raise ValueError(
+                    f"Vector dimension {dense.shape[1]} does not match the dimension of the index {dimension}"
+                )
+            sparse_matrix = sparse_vecs_to_csr(
+                df_embeddings[f"{col}_sparse_vecs_upsert"]
+            )
+            save_csr(sparse_matrix, dirpath, f"{col}_sparse")
+            np.save(dirpath / f"{col}_ids.npy", ids, allow_pickle=True)
+            info["namespaces"][col] = {
+                "vector_count": len(ids),
+                "vocab_size": sparse_matrix.shape[1],
+            }
+        metadata = dict(
+            zip(ids, df_embeddings[list(metadata_columns)].to_dict(orient="records"))
+        )
+        with open(dirpath / "metadata.pkl", "wb") as f:
+            pickle.dump(metadata, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(dirpath / "index.json", "w") as f:
+            json.dump(info, f, indent=2)
+        ss_logger.info(f"Saved exact hybrid index with {len(ids)} vectors to {dirpath}")
+        return cls(dirpath, query_batch_size)
+
+    def describe_index_stats(self, **kwargs) -> LocalPineconeResponse:
+        namespaces = {
+            name: LocalPineconeResponse(vector_count=len(ns["ids"]))
+            for name, ns in self.namespaces.items()
+        }
+        return LocalPineconeResponse(
+            dimension=self.dimension,
+            index_fullness=0.0,
+            namespaces=namespaces,
+            total_vector_count=sum(ns.vector_count for ns in namespaces.values()),
+        )
+
+    def fetch(self, ids, namespace="", **kwargs) -> LocalPineconeResponse:
+        vectors = {}
+        ns = self.namespaces.get(namespace)
+        for _id in ids if ns else []:
+            row = ns["rows"].get(str(_id))
+            if row is not None:
+                sparse_row = ns["sparse"][row]
+                vectors[str(_id)] = LocalPineconeResponse(
+                    id=str(_id),
+                    values=ns["dense"][row].tolist(),
+                    sparse_values={
+                        "indices": sparse_row.indices.tolist(),
+                        "values": sparse_row.data.tolist(),
+                    },
+                    metadata=self.metadata.get(str(_id), {}),
+                )
+        return LocalPineconeResponse(namespace=namespace, vectors=vectors)
+
+    def score_batch(self, ns, dense, sparse_queries) -> np.ndarray:
+        """(n_queries, n_vectors) hybrid scores; dense or sparse_queries may be None (alpha 0 or 1)"""
+
+        n_queries = dense.shape[0] if dense is not None else sparse_queries.shape[0]
+        scores = np.zeros((n_queries, len(ns["ids"])), dtype=np.float32)
+        if dense is not None:
+            scores += dense @ ns["dense"].T
+        if sparse_queries is not None and sparse_queries.nnz:
+            scores += (ns["sparse"] @ sparse_queries.T).toarray().T  # keeps index CSR
+        return scores
+
+    def search_batch(self, ns, dense, sparse_queries, top_k: int):
+        """Rows and scores of the top_k vectors per query, by brute force"""
+        return top_k_rows(self.score_batch(ns, dense, sparse_queries), top_k)
+
+    def query_many(
+        self,
+        vectors=None,
+        sparse_vectors=None,
+        top_k=10,
+        namespace="",
+        include_metadata=False,
+        **kwargs,
+    ) -> list:
+        """Pinecone-shaped query responses for many (already alpha-scaled) hybrid queries at once"""
+
+        ns = self.namespaces.get(namespace)
+        n_queries = len(vectors) if vectors is not None else len(sparse_vectors)
+        if ns is None:
+            return [
+                LocalPineconeResponse(matches=[], namespace=namespace)
+                for _ in range(n_queries)
+            ]
+        if vectors is not None:
+            vectors = np.asarray(list(vectors), dtype=np.float32).reshape(
+                n_queries, self.dimension
+            )
+        if sparse_vectors is not None:
+            sparse_vectors = sparse_vecs_to_csr(sparse_vectors, ns["sparse"].shape[1])
+        responses = []
+        for i in range(0, n_queries, self.query_batch_size):
+            batch = slice(i, i + self.query_batch_size)
+            top_rows = self.search_batch(
+                ns,
+                vectors[batch] if vectors is not None else None,
+                sparse_vectors[batch] if sparse_vectors is not None else None,
+                int(top_k),
+            )
+            for rows, row_scores in zip(*top_rows):
+                matches = []
+                for row, score in zip(rows, row_scores):
+                    match = LocalPineconeResponse(id=ns["ids"][row], score=float(score))
+                    if include_metadata:
+                        match["metadata"] = self.metadata.get(match.id, {})
+                    matches.append(match)
+                responses.append(
+                    LocalPineconeResponse(matches=matches, namespace=namespace)
+                )
+        return responses
+
+    def query(
+        self, vector=None, sparse_vector=None, top_k=10, namespace="", **kwargs
+    ) -> LocalPineconeResponse:
+        return self.query_many(
+            [vector] if vector is not None else None,
+            [sparse_vector] if sparse_vector is not None else None,
+            top_k,
+            namespace,
+            **kwargs,
+        )[0]
+
+
+class ExactHybridStore:
+    """Drop-in for the pinecone module returned by connect_to_pinecone, holding one ExactHybridIndex per folder."""
+
+    def __init__(self, dirpath=None, query_batch_size: int = 256) -> None:
+        self.dirpath = Path(dirpath or DEFAULT_DIRPATH)
+        self.query_batch_size = query_batch_size
+
+    def init(self, api_key=None, environment=None, **kwargs) -> None:
+        pass  # no credentials needed locally
+
+    def list_indexes(self) -> list:
+        return sorted(fp.parent.name for fp in self.dirpath.glob("*/index.json"))
+
+    @log(msg="Building exact hybrid index from UMLS embeddings")
+    def build_index(
+        self, name, df_embeddings, embed_columns, metadata_columns, dimension, metric
+    ) -> ExactHybridIndex:
+        return ExactHybridIndex.build(
+            self.dirpath / name,
+            df_embeddings,
+            embed_columns,
+            metadata_columns,
+            dimension,
+            metric,
+            self.query_batch_size,
+        )
+
+    def Index(self, index_name) -> ExactHybridIndex:
+        if index_name not in self.list_indexes():
+            raise ValueError(
+                f"Exact hybrid index '{index_name}' not found in {self.dirpath}"
+            )
+        return ExactHybridIndex(self.dirpath / index_name, self.query_batch_size)
@@ -0,0 +1,224 @@
+"""
+
+Approximate local hybrid search with HNSW graphs (hnswlib) over the dense UMLS embeddings of each namespace.
+
+The graphs are saved next to the memory-mapped files of an exact index (see exact_search.py), which stay the source
+for sparse scores, fetch and recall checks. Dense-only queries (alpha=1) are answered by the graph alone. Hybrid
+queries take hybrid_candidates dense neighbours from the graph and re-score them exactly with the sparse vectors;
+sparse-only queries (alpha=0) skip the graph. ef_search (and hybrid_candidates for hybrid queries) trade recall for
+latency; recall_at_k measures it against brute-force search at a given alpha. Select it with:
+
+    apis.pinecone.index_info.backend=hnsw
+
+Requires the optional hnswlib package (pip install hnswlib).
+
+"""
+
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from ddcuimap.semantic_search import ss_logger, log
+from ddcuimap.semantic_search.utils.exact_search import (
+    ExactHybridIndex,
+    ExactHybridStore,
+    sparse_vecs_to_csr,
+    top_k_rows,
+)
+from ddcuimap.utils.sqlite_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_DIRPATH = DEFAULT_CACHE_DIR / "hnsw_index"
+
+
+def import_hnswlib():
+    try:
+        import hnswlib
+    except ImportError:
+        raise ImportError(
+            "The hnsw backend requires hnswlib. Install it with 'pip install hnswlib'."
+        )
+    return hnswlib
+
+
+class HNSWHybridIndex(ExactHybridIndex):
+    """Models an exact hybrid index whose dense side is searched through per-namespace HNSW graphs."""
+
+    def __init__(
+        self,
+        dirpath,
+        ef_search: int = 100,
+        hybrid_candidates: int = 100,
+        num_threads: int = -1,
+        query_batch_size: int = 256,
+    ) -> None:
+        super().__init__(dirpath, query_batch_size)
+        hnswlib = import_hnswlib()
+        self.ef_search = ef_search
+        self.hybrid_candidates = hybrid_candidates
+        self.num_threads = num_threads
+        for name, ns in self.namespaces.items():
+            graph = hnswlib.Index(space="ip", dim=self.dimension)
+            graph.load_index(
+                str(self.dirpath / f"{name}_hnsw.bin"), max_elements=len(ns["ids"])
+            )
+            graph.set_num_threads(num_threads)
+            ns["hnsw"] = graph
+
+    @staticmethod
+    def build_graphs(
+        dirpath, M: int = 16, ef_construction: int = 200, num_threads: int = -1
+    ) -> None:
+        """Builds and saves an HNSW graph over the dense matrix of each namespace of an exact index"""
+
+        hnswlib = import_hnswlib()
+        exact_index = ExactHybridIndex(dirpath)
+        for name, ns in exact_index.namespaces.items():
+            start = time.perf_counter()
+            graph = hnswlib.Index(space="ip", dim=exact_index.dimension)
+            graph.init_index(
+                max_elements=len(ns["ids"]), ef_construction=ef_construction, M=M
+            )
+            graph.add_items(
+                ns["dense"], np.arange(len(ns["ids"])), num_threads=num_threads
+            )
+            graph.save_index(str(exact_index.dirpath / f"{name}_hnsw.bin"))
+            ss_logger.info(
+                f"Built HNSW graph for namespace '{name}' in {time.perf_counter() - start:.1f} s"
+            )
+        exact_index.info["hnsw"] = {"M": M, "ef_construction": ef_construction}
+        with open(exact_index.dirpath / "index.json", "w") as f:
+            json.dump(exact_index.info, f, indent=2)
+
+    def search_batch(self, ns, dense, sparse_queries, top_k: int):
+        """Graph neighbours for dense queries, re-scored with the sparse vectors for hybrid queries"""
+
+        if dense is None or top_k <= 0:  # sparse-only: the graph cannot help
+            return super().search_batch(ns, dense, sparse_queries, top_k)
+        hybrid = sparse_queries is not None and sparse_queries.nnz > 0
+        k = min(max(top_k, self.hybrid_candidates) if hybrid else top_k, len(ns["ids"]))
+        graph = ns["hnsw"]
+        graph.set_ef(max(self.ef_search, k))
+        labels, distances = graph.knn_query(dense, k=k, num_threads=self.num_threads)
+        labels = labels.astype(np.int64)
+        if not hybrid:
+            return labels, 1 - distances  # ip distance is 1 - dot product
+        n_queries = labels.shape[0]
+        scores = np.einsum(
+            "qd,qkd->qk", dense, ns["dense"][labels.ravel()].reshape(n_queries, k, -1)
+        )
+        candidates = ns["sparse"][labels.ravel()]
+        queries = sparse_queries[np.repeat(np.arange(n_queries), k)]
+        scores += np.asarray(candidates.multiply(queries).sum(axis=1)).reshape(
+            n_queries, k
+        )
+        top, top_scores = top_k_rows(scores, top_k)
+        return np.take_along_axis(labels, top, axis=1), top_scores
+
+    def recall_at_k(
+        self,
+        namespace,
+        queries,
+        k: int = 20,
+        ef_searches=(20, 50, 100, 200),
+        sparse_queries=None,
+        alpha: float = 1.0,
+    ) -> pd.DataFrame:
+        """Recall@k and ms/query per ef_search against brute-force search, for dense queries (alpha=1) or hybrid
+        queries (dense queries scaled by alpha, sparse_values dicts of sparse_queries by 1 - alpha)
+        """
+
+        if alpha < 1 and sparse_queries is None:
+            raise ValueError("Hybrid recall (alpha < 1) needs sparse_queries")
+        ns = self.namespaces[namespace]
+        dense = alpha * np.asarray(queries, dtype=np.float32) if alpha > 0 else None
+        if alpha < 1:
+            sparse_queries = (1 - alpha) * sparse_vecs_to_csr(
+                sparse_queries, ns["sparse"].shape[1]
+            )
+        else:
+            sparse_queries = None
+        n_queries = len(queries)
+        start = time.perf_counter()
+        exact_rows, _ = ExactHybridIndex.search_batch(
+            self, ns, dense, sparse_queries, k
+        )
+        exact_ms = 1000 * (time.perf_counter() - start) / n_queries
+        ef_search = self.ef_search
+        ls_results = []
+        for ef in ef_searches:
+            self.ef_search = ef
+            start = time.perf_counter()
+            rows, _ = self.search_batch(ns, dense, sparse_queries, k)
+            hnsw_ms = 1000 * (time.perf_counter() - start) / n_queries
+            hits = [len(set(a).intersection(b)) for a, b in zip(rows, exact_rows)]
+            ls_results.append(
+                {
+                    "namespace": namespace,
+                    "alpha": alpha,
+                    "ef_search": ef,
+                    "hybrid_candidates": self.hybrid_candidates if alpha < 1 else None,
+                    f"recall@{k}": sum(hits) / (k * n_queries),
+                    "hnsw_ms_per_query": hnsw_ms,
+                    "exact_ms_per_query": exact_ms,
+                }
+            )
+        self.ef_search = ef_search
+        return pd.DataFrame(ls_results)
+
+
+class HNSWHybridStore(ExactHybridStore):
+    """Drop-in for the pinecone module returned by connect_to_pinecone, holding one HNSWHybridIndex per folder."""
+
+    def __init__(
+        self,
+        dirpath=None,
+        M: int = 16,
+        ef_construction: int = 200,
+        ef_search: int = 100,
+        hybrid_candidates: int = 100,
+        num_threads: int = -1,
+        query_batch_size: int = 256,
+    ) -> None:
+        super().__init__(dirpath or DEFAULT_DIRPATH, query_batch_size)
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.hybrid_candidates = hybrid_candidates
+        self.num_threads = num_threads
+
+    def list_indexes(self) -> list:
+        return sorted(
+            fp.parent.name
+            for fp in self.dirpath.glob("*/index.json")
+            if "hnsw" in json.loads(fp.read_text())
+        )
+
+    @log(msg="Building HNSW hybrid index from UMLS embeddings")
+    def build_index(
+        self, name, df_embeddings, embed_columns, metadata_columns, dimension, metric
+    ) -> HNSWHybridIndex:
+        ExactHybridIndex.build(
+            self.dirpath / name,
+            df_embeddings,
+            embed_columns,
+            metadata_columns,
+            dimension,
+            metric,
+        )
+        HNSWHybridIndex.build_graphs(
+            self.dirpath / name, self.M, self.ef_construction, self.num_threads
+        )
+        return self.Index(name)
+
+    def Index(self, index_name) -> HNSWHybridIndex:
+        if index_name not in self.list_indexes():
+            raise ValueError(f"HNSW index '{index_name}' not found in {self.dirpath}")
+        return HNSWHybridIndex(
+            self.dirpath / index_name,
+            self.ef_search,
+            self.hybrid_candidates,
+            self.num_threads,
+            self.query_batch_size,
+        )
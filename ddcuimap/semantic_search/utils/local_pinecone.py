@@ -0,0 +1,316 @@
+"""
+
+In-process stand-in for the subset of the pinecone-client (v2) API used by semantic_search.
+
+LocalPinecone mirrors the module-level calls (init, list_indexes, create_index, describe_index, delete_index, Index)
+and LocalPineconeIndex the index calls (upsert with sparse_values, hybrid dense/sparse query by namespace, fetch,
+describe_index_stats), scored like a Pinecone pod index and with an injectable per-call latency (and share of
+throttled 429 queries) so query and upsert throughput can be measured offline. Indexes are pickled to dirpath on save() so an index upserted by
+step3_upsert_umls_subset can be queried by batch_hybrid_query_pipeline. Select it with:
+
+    apis.pinecone.index_info.backend=local
+    apis.pinecone.index_info.local.dirpath=path/to/local_pinecone
+
+"""
+
+import pickle
+import random
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from ddcuimap.semantic_search import ss_logger
+from ddcuimap.utils.sqlite_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_DIRPATH = DEFAULT_CACHE_DIR / "local_pinecone"
+METRICS = ["dotproduct", "cosine", "euclidean"]
+
+
+class LocalPineconeResponse(dict):
+    """Dict with attribute access, like the pinecone-client response objects (e.g. response.matches[0].id)."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class LocalPineconeApiException(Exception):
+    """Mirrors the status/reason attributes of pinecone-client ApiException, e.g. for throttled (429) calls."""
+
+    def __init__(self, status=None, reason=None) -> None:
+        super().__init__(f"({status}) Reason: {reason}")
+        self.status = status
+        self.reason = reason
+
+
+class LocalNamespace:
+    """Models the vectors of one namespace with lazily stacked dense/sparse matrices for scoring."""
+
+    def __init__(self) -> None:
+        self.ids = []
+        self.rows = {}  # id -> row
+        self.values = []
+        self.sparse_values = []
+        self.metadata = []
+        self._dense = None
+        self._sparse = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_dense"] = state["_sparse"] = None
+        return state
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def upsert(self, id, values, sparse_values, metadata) -> None:
+        row = self.rows.get(id)
+        if row is None:
+            self.rows[id] = len(self.ids)
+            self.ids.append(id)
+            self.values.append(values)
+            self.sparse_values.append(sparse_values)
+            self.metadata.append(metadata)
+        else:
+            self.values[row] = values
+            self.sparse_values[row] = sparse_values
+            self.metadata[row] = metadata
+        self._dense = self._sparse = None
+
+    def dense_matrix(self) -> np.ndarray:
+        if self._dense is None:
+            self._dense = np.vstack(self.values)
+        return self._dense
+
+    def sparse_matrix(self) -> sparse.csc_matrix:
+        """Column-major so a query only touches the columns of its own nonzero indices"""
+        if self._sparse is None:
+            indptr = np.cumsum([0] + [len(sv["indices"]) for sv in self.sparse_values])
+            indices = np.array(
+                [i for sv in self.sparse_values for i in sv["indices"]], dtype=np.int64
+            )
+            data = np.array(
+                [v for sv in self.sparse_values for v in sv["values"]],
+                dtype=np.float32,
+            )
+            n_cols = int(indices.max()) + 1 if len(indices) else 0
+            self._sparse = sparse.csr_matrix(
+                (data, indices, indptr), shape=(len(self.ids), n_cols)
+            ).tocsc()
+        return self._sparse
+
+
+class LocalPineconeIndex:
+    """Models a Pinecone index: namespaced vectors with optional sparse values, scored by the index metric."""
+
+    def __init__(self, name, dimension, metric="cosine", pod_type=None) -> None:
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {METRICS}, got '{metric}'")
+        self.name = name
+        self.dimension = int(dimension)
+        self.metric = metric
+        self.pod_type = pod_type
+        self.namespaces = {}
+        self.filepath = None
+        self.latency = 0.0
+        self.throttle_rate = 0.0
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def save(self, filepath=None) -> None:
+        filepath = Path(filepath or self.filepath)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(filepath, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        ss_logger.info(f"Saved local Pinecone index '{self.name}' to {filepath}")
+
+    @staticmethod
+    def load(filepath) -> "LocalPineconeIndex":
+        with open(filepath, "rb") as f:
+            return pickle.load(f)
+
+    def upsert(self, vectors, namespace="", **kwargs) -> LocalPineconeResponse:
+        """Upserts dicts with id/values/sparse_values/metadata or (id, values[, metadata]) tuples"""
+        time.sleep(self.latency)
+        records = []
+        for vector in vectors:
+            if not isinstance(vector, dict):
+                vector = dict(zip(["id", "values", "metadata"], vector))
+            values = np.asarray(vector["values"], dtype=np.float32)
+            if values.shape != (self.dimension,):
+                raise ValueError(
+                    f"Vector dimension {values.size} does not match the dimension of the index {self.dimension}"
+                )
+            sparse_values = vector.get("sparse_values") or {"indices": [], "values": []}
+            if sparse_values["indices"] and self.metric != "dotproduct":
+                raise ValueError(
+                    "Sparse values are only supported for indexes with the dotproduct metric"
+                )
+            records.append(
+                (str(vector["id"]), values, sparse_values, vector.get("metadata") or {})
+            )
+        with self._lock:
+            ns = self.namespaces.setdefault(namespace, LocalNamespace())
+            for record in records:
+                ns.upsert(*record)
+        return LocalPineconeResponse(upserted_count=len(records))
+
+    def query(
+        self,
+        vector=None,
+        sparse_vector=None,
+        top_k=10,
+        namespace="",
+        include_values=False,
+        include_metadata=False,
+        filter=None,
+        **kwargs,
+    ) -> LocalPineconeResponse:
+        """Top-k matches by dense score plus sparse dot product (hybrid), like a dotproduct pod index"""
+        if filter:
+            raise NotImplementedError("Metadata filters are not supported locally")
+        time.sleep(self.latency)
+        if random.random() < self.throttle_rate:
+            raise LocalPineconeApiException(status=429, reason="Too Many Requests")
+        with self._lock:
+            ns = self.namespaces.get(namespace)
+            if not ns:
+                return LocalPineconeResponse(matches=[], namespace=namespace)
+            scores = self.dense_scores(ns, np.asarray(vector, dtype=np.float32))
+            if sparse_vector and sparse_vector["indices"]:
+                scores += self.sparse_scores(ns, sparse_vector)
+            top_k = min(int(top_k), len(ns))
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            matches = []
+            for row in top:
+                match = LocalPineconeResponse(id=ns.ids[row], score=float(scores[row]))
+                if include_values:
+                    match["values"] = ns.values[row].tolist()
+                    match["sparse_values"] = ns.sparse_values[row]
+                if include_metadata:
+                    match["metadata"] = ns.metadata[row]
+                matches.append(match)
+        return LocalPineconeResponse(matches=matches, namespace=namespace)
+
+    def dense_scores(self, ns, vector) -> np.ndarray:
+        matrix = ns.dense_matrix()
+        if self.metric == "euclidean":
+            return -np.linalg.norm(matrix - vector, axis=1)
+        scores = matrix @ vector
+        if self.metric == "cosine":
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector)
+            scores = np.divide(
+                scores, norms, out=np.zeros_like(scores), where=norms > 0
+            )
+        return scores
+
+    def sparse_scores(self, ns, sparse_vector) -> np.ndarray:
+        if self.metric != "dotproduct":
+            raise ValueError(
+                "Sparse vectors are only supported for indexes with the dotproduct metric"
+            )
+        matrix = ns.sparse_matrix()
+        indices = np.asarray(sparse_vector["indices"], dtype=np.int64)
+        values = np.asarray(sparse_vector["values"], dtype=np.float32)
+        keep = indices < matrix.shape[1]  # terms no stored vector contains score 0
+        return matrix[:, indices[keep]] @ values[keep]
+
+    def fetch(self, ids, namespace="", **kwargs) -> LocalPineconeResponse:
+        time.sleep(self.latency)
+        vectors = {}
+        with self._lock:
+            ns = self.namespaces.get(namespace, LocalNamespace())
+            for id in ids:
+                row = ns.rows.get(str(id))
+                if row is not None:
+                    vectors[ns.ids[row]] = LocalPineconeResponse(
+                        id=ns.ids[row],
+                        values=ns.values[row].tolist(),
+                        sparse_values=ns.sparse_values[row],
+                        metadata=ns.metadata[row],
+                    )
+        return LocalPineconeResponse(namespace=namespace, vectors=vectors)
+
+    def describe_index_stats(self, **kwargs) -> LocalPineconeResponse:
+        with self._lock:
+            namespaces = {
+                name: LocalPineconeResponse(vector_count=len(ns))
+                for name, ns in self.namespaces.items()
+            }
+        return LocalPineconeResponse(
+            dimension=self.dimension,
+            index_fullness=0.0,
+            namespaces=namespaces,
+            total_vector_count=sum(ns.vector_count for ns in namespaces.values()),
+        )
+
+
+class LocalPinecone:
+    """Drop-in for the pinecone module returned by connect_to_pinecone, holding LocalPineconeIndex objects."""
+
+    def __init__(
+        self, dirpath=None, latency: float = 0.0, throttle_rate: float = 0.0
+    ) -> None:
+        self.dirpath = Path(dirpath or DEFAULT_DIRPATH)
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.indexes = {}
+
+    def init(self, api_key=None, environment=None, **kwargs) -> None:
+        pass  # no credentials needed locally
+
+    def filepath(self, name) -> Path:
+        return self.dirpath / f"{name}.pkl"
+
+    def list_indexes(self) -> list:
+        saved = [fp.stem for fp in self.dirpath.glob("*.pkl")]
+        return sorted(set(self.indexes).union(saved))
+
+    def create_index(
+        self, name, dimension, metric="cosine", pod_type=None, **kwargs
+    ) -> None:
+        if name in self.list_indexes():
+            raise ValueError(f"Index '{name}' already exists")
+        self.indexes[name] = LocalPineconeIndex(name, dimension, metric, pod_type)
+        ss_logger.info(f"Created local Pinecone index '{name}'")
+
+    def delete_index(self, name) -> None:
+        self.indexes.pop(name, None)
+        self.filepath(name).unlink(missing_ok=True)
+
+    def describe_index(self, name) -> LocalPineconeResponse:
+        index = self.Index(name)
+        return LocalPineconeResponse(
+            name=name,
+            dimension=index.dimension,
+            metric=index.metric,
+            pod_type=index.pod_type,
+        )
+
+    def Index(self, index_name) -> LocalPineconeIndex:
+        index = self.indexes.get(index_name)
+        if index is None:
+            fp_index = self.filepath(index_name)
+            if not fp_index.exists():
+                raise ValueError(
+                    f"Local Pinecone index '{index_name}' not found in {self.dirpath}"
+                )
+            index = self.indexes[index_name] = LocalPineconeIndex.load(fp_index)
+        index.filepath = self.filepath(index_name)
+        index.latency = self.latency
+        index.throttle_rate = self.throttle_rate
+        return index
@@ -4,27 +4,34 @@ This module contains custom defined runners for semantic search.
 
 """
 
-import pinecone
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
-from ddcuimap.semantic_search import log
+from ddcuimap.semantic_search import ss_logger, log
+from ddcuimap.utils.rate_limiter import RateLimiter
 
 
-def fetch_id_metadata(index, cfg):
-    """Fetch metadata for a list of IDs from Pinecone index"""
+def fetch_id_metadata(index, cfg, batch_size=1000):
+    """Fetch metadata for the vector IDs of the configured namespaces from Pinecone index"""
 
     namespaces_cfg = cfg.semantic_search.pinecone.index.namespaces
-    namespaces_index = index.describe_index_stats()["namespaces"].keys()
-    namespaces = list(set(namespaces_cfg).intersection(namespaces_index))
+    namespaces_index = index.describe_index_stats()["namespaces"]
+    namespaces = [name for name in namespaces_cfg if name in namespaces_index]
 
-    dict_ids_upsert = {}
+    dict_ids_metadata = {}
     for name in namespaces:
-        vector_count = index.describe_index_stats()["namespaces"][name]["vector_count"]
+        vector_count = namespaces_index[name]["vector_count"]
         ids = list(map(str, range(vector_count)))
-        fetch_response = index.fetch(ids=ids, namespace=name)
-        dict_ids_upsert[name] = fetch_response.ids
-    return dict_ids_upsert
+        for i in range(0, len(ids), batch_size):  # Pinecone caps ids per fetch
+            fetch_response = index.fetch(ids=ids[i : i + batch_size], namespace=name)
+            for _id, vector in fetch_response["vectors"].items():
+                dict_ids_metadata.setdefault(_id, {}).update(vector["metadata"])
+    return dict_ids_metadata
 
 
 @log(msg="Scaling Dense and Sparse Vectors")
@@ -43,22 +50,39 @@ def hybrid_scale(dense, sparse, alpha: float):
     return hdense, hsparse
 
 
+def query_with_retry(index, query, concurrency, rate_limiter=None):
+    """Runs one index query, retrying with exponential backoff plus jitter when throttled (e.g. 429)"""
+
+    for attempt in range(concurrency.max_retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return index.query(**query)
+        except Exception as e:
+            status = getattr(e, "status", None)  # pinecone ApiException
+            if (
+                status not in concurrency.status_forcelist
+                or attempt == concurrency.max_retries
+            ):
+                raise
+            backoff = concurrency.backoff_factor * 2**attempt + random.uniform(
+                0, concurrency.backoff_jitter
+            )
+            ss_logger.warning(
+                f"Query to namespace '{query['namespace']}' failed with status {status}. Retrying in {backoff:.2f} s."
+            )
+            time.sleep(backoff)
+
+
 @log(msg="Running Pinecone Semantic Search Runner")
-def hybrid_search_runner(df_embeddings, alpha, cfg):  # TODO: add alpha to config
-    """Custom defined query runner for semantic search"""
+def hybrid_search_runner(index, df_embeddings, alpha, cfg):  # TODO: add alpha to config
+    """Custom defined query runner for semantic search against a Pinecone (or local stand-in) index"""
 
-    index_name = cfg.semantic_search.pinecone.index.index_name
-    index = pinecone.Index(index_name=index_name)
-    var_results = {}
-    for e, (_, query_row) in tqdm(
-        enumerate(df_embeddings.iterrows()),
-        total=df_embeddings.shape[0],
-        desc="Semantic Search Runner",
-    ):
-        vn = query_row.get(cfg.custom.data_dictionary_settings.variable_column)
-        search_ID = query_row.get("search_ID")
-        results = {}
-        # RUN DEFINED QUERIES
+    if hasattr(index, "query_many"):  # local index that scores query batches at once
+        return batch_hybrid_search_runner(index, df_embeddings, alpha, cfg)
+    queries = {}
+    for e, (_, query_row) in enumerate(df_embeddings.iterrows()):
+        # BUILD DEFINED QUERIES
         for colname, query in cfg.semantic_search.query.queries.hybrid.items():
             col_prefix = query[0]
             namespace = query[1]
@@ -67,14 +91,98 @@ def hybrid_search_runner(df_embeddings, alpha, cfg):  # TODO: add alpha to confi
                 f"{col_prefix}_sparse_vecs_upsert"
             ]  # TODO need to specify query instead of upsert
             dense_vec, sparse_vec = hybrid_scale(dense_vec, sparse_vec, alpha)
-            results[colname] = index.query(
-                namespace=namespace,
-                top_k=cfg.semantic_search.query.top_k,
-                vector=dense_vec,
-                sparse_vector=sparse_vec,
-                include_metadata=True,
+            queries[(e, colname)] = {
+                "namespace": namespace,
+                "top_k": cfg.semantic_search.query.top_k,
+                "vector": dense_vec,
+                "sparse_vector": sparse_vec,
+                "include_metadata": True,
+            }
+
+    # RUN QUERIES
+    concurrency = cfg.apis.pinecone.index_info.concurrency
+    rate_limiter = (
+        RateLimiter(concurrency.requests_per_second)
+        if concurrency.requests_per_second
+        else None
+    )
+    responses = {}
+    if concurrency.max_workers > 1:
+        with ThreadPoolExecutor(max_workers=concurrency.max_workers) as executor:
+            futures = {
+                executor.submit(
+                    query_with_retry, index, query, concurrency, rate_limiter
+                ): key
+                for key, query in queries.items()
+            }
+            for future in tqdm(
+                as_completed(futures),
+                total=len(futures),
+                desc="Semantic Search Runner",
+            ):
+                responses[futures[future]] = future.result()
+    else:
+        for key, query in tqdm(
+            queries.items(), total=len(queries), desc="Semantic Search Runner"
+        ):
+            responses[key] = query_with_retry(index, query, concurrency, rate_limiter)
+
+    # ASSEMBLE RESULTS IN ROW ORDER REGARDLESS OF COMPLETION ORDER
+    var_results = {}
+    for e, (_, query_row) in enumerate(df_embeddings.iterrows()):
+        vn = query_row.get(cfg.custom.data_dictionary_settings.variable_column)
+        search_ID = query_row.get("search_ID")
+        var_results[vn] = {
+            search_ID: {
+                colname: responses[(e, colname)]
+                for colname in cfg.semantic_search.query.queries.hybrid
+            }
+        }
+    return var_results
+
+
+@log(msg="Running batched Semantic Search Runner")
+def batch_hybrid_search_runner(index, df_embeddings, alpha, cfg):
+    """Runs each defined query for all rows in one index.query_many call, scaled as in hybrid_scale"""
+
+    # check alpha value is in range
+    if alpha < 0 or alpha > 1:
+        raise ValueError("Alpha must be between 0 and 1")
+    query_results = {}
+    for colname, query in cfg.semantic_search.query.queries.hybrid.items():
+        col_prefix = query[0]
+        namespace = query[1]
+        dense_vecs = None  # alpha 0/1 zeroes one side, so skip scoring it
+        if alpha > 0:
+            dense_vecs = alpha * np.asarray(
+                df_embeddings[f"{col_prefix}_dense_vecs"].tolist(), dtype=np.float64
             )
-        var_results[vn] = {search_ID: results}
+        sparse_vecs = None
+        if alpha < 1:
+            sparse_vecs = [
+                {
+                    "indices": sparse["indices"],
+                    "values": [v * (1 - alpha) for v in sparse["values"]],
+                }
+                for sparse in df_embeddings[f"{col_prefix}_sparse_vecs_upsert"]
+            ]
+        query_results[colname] = index.query_many(
+            vectors=dense_vecs,
+            sparse_vectors=sparse_vecs,
+            top_k=cfg.semantic_search.query.top_k,
+            namespace=namespace,
+            include_metadata=True,
+        )
+
+    var_results = {}
+    for e, (_, query_row) in enumerate(df_embeddings.iterrows()):
+        vn = query_row.get(cfg.custom.data_dictionary_settings.variable_column)
+        search_ID = query_row.get("search_ID")
+        var_results[vn] = {
+            search_ID: {
+                colname: responses[e] for colname, responses in query_results.items()
+            }
+        }
     return var_results
 
 
@@ -0,0 +1,257 @@
+"""
+
+Local inverted index over the SPLADE vectors built by builders.hybrid_builder (*_sparse_vecs_upsert).
+
+Each namespace's sparse matrix is transposed into postings (one doc-sorted list of vector rows and weights per
+vocabulary term) and saved as compact memory-mapped arrays next to the files of an exact index (see exact_search.py):
+offsets (int64), docs (int32), weights (float32) and each term's max weight. A batch of queries is scored
+term-at-a-time in one sparse product with the postings, so only the postings of the batch's query terms are scanned
+and sparse-only queries (alpha=0) never touch the dense matrix. Hybrid queries add the brute-force dense scores, with
+the alpha weighting of runners.hybrid_scale already applied to the query. Matches and scores are identical to the
+exact backend, including the zero-score matches that pad queries touching fewer than top_k vectors. Sparse-only
+queries can instead be scored one at a time with MaxScore pruning (pruning=true): terms are visited by descending
+upper bound, and once the bounds of the remaining terms cannot lift an unseen vector into the top_k, those terms are
+only looked up for the current candidates. It only pays off on large indexes with long postings (see
+benchmarks/bench_sparse_search.py). Select it with:
+
+    apis.pinecone.index_info.backend=inverted
+
+"""
+
+import json
+
+import numpy as np
+from scipy import sparse
+
+from ddcuimap.semantic_search import ss_logger, log
+from ddcuimap.semantic_search.utils.exact_search import (
+    ExactHybridIndex,
+    ExactHybridStore,
+    top_k_rows,
+)
+from ddcuimap.utils.sqlite_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_DIRPATH = DEFAULT_CACHE_DIR / "inverted_index"
+POSTINGS_ARRAYS = ["offsets", "docs", "weights", "max_weights"]
+
+
+def top_k_columns(columns, scores, top_k: int, n_cols: int):
+    """Top_k columns and scores of a row whose other columns score 0, sorted descending (ties by column) like
+    top_k_rows on the dense row: rows with fewer than top_k positive scores are padded with the lowest unscored columns
+    """
+
+    top_k = min(top_k, n_cols)
+    if top_k <= 0:
+        return columns[:0].astype(np.int64), scores[:0]
+    top = (
+        np.argpartition(-scores, top_k - 1)[:top_k]
+        if len(scores) > top_k
+        else np.arange(len(scores))
+    )
+    if len(top) < top_k or scores[top].min() <= 0:
+        unscored = np.ones(min(n_cols, top_k + len(columns)), dtype=bool)
+        unscored[columns[columns < len(unscored)]] = False
+        pad = np.flatnonzero(unscored)[:top_k]
+        columns = np.concatenate([columns[top], pad])
+        scores = np.concatenate([scores[top], np.zeros(len(pad), dtype=scores.dtype)])
+        order = np.lexsort((columns, -scores))[:top_k]
+    else:
+        columns, scores = columns[top], scores[top]
+        order = np.lexsort((columns, -scores))
+    return columns[order].astype(np.int64), scores[order]
+
+
+def top_k_sparse_rows(scores: sparse.csr_matrix, top_k: int):
+    """Column indices and scores of the top_k highest scores per CSR row (unstored entries score 0)"""
+
+    ls_rows, ls_scores = [], []
+    for i in range(scores.shape[0]):
+        row = slice(scores.indptr[i], scores.indptr[i + 1])
+        rows, row_scores = top_k_columns(
+            scores.indices[row], scores.data[row], top_k, scores.shape[1]
+        )
+        ls_rows.append(rows)
+        ls_scores.append(row_scores)
+    return ls_rows, ls_scores
+
+
+class InvertedHybridIndex(ExactHybridIndex):
+    """Models an exact hybrid index whose sparse side is scored from per-namespace postings."""
+
+    def __init__(self, dirpath, pruning: bool = False, query_batch_size: int = 256):
+        super().__init__(dirpath, query_batch_size)
+        self.pruning = pruning
+        for name, ns in self.namespaces.items():
+            ns["postings"] = {
+                array: np.load(
+                    self.dirpath / f"{name}_postings_{array}.npy", mmap_mode="r"
+                )
+                for array in POSTINGS_ARRAYS
+            }
+            offsets = ns["postings"]["offsets"]
+            ns["postings"]["matrix"] = sparse.csr_matrix(
+                (
+                    ns["postings"]["weights"],
+                    ns["postings"]["docs"],
+                    offsets.astype(np.int32) if offsets[-1] < 2**31 else offsets,
+                ),
+                shape=(len(offsets) - 1, len(ns["ids"])),
+            )
+
+    @staticmethod
+    def build_postings(dirpath) -> None:
+        """Writes doc-sorted postings for every term of each namespace of an exact index"""
+
+        exact_index = ExactHybridIndex(dirpath)
+        for name, ns in exact_index.namespaces.items():
+            by_term = ns["sparse"].tocsc()
+            by_term.sort_indices()
+            max_weights = np.zeros(by_term.shape[1], dtype=np.float32)
+            lengths = np.diff(by_term.indptr)
+            if by_term.nnz:
+                max_weights[lengths > 0] = np.maximum.reduceat(
+                    by_term.data, by_term.indptr[:-1][lengths > 0]
+                )
+            arrays = {
+                "offsets": by_term.indptr.astype(np.int64),
+                "docs": by_term.indices.astype(np.int32),
+                "weights": by_term.data.astype(np.float32),
+                "max_weights": max_weights,
+            }
+            for array, values in arrays.items():
+                np.save(exact_index.dirpath / f"{name}_postings_{array}.npy", values)
+            ss_logger.info(
+                f"Built postings for namespace '{name}': {by_term.shape[1]} terms, {by_term.nnz} entries"
+            )
+        exact_index.info["inverted"] = True
+        with open(exact_index.dirpath / "index.json", "w") as f:
+            json.dump(exact_index.info, f, indent=2)
+
+    @staticmethod
+    def max_score(postings, terms, weights, n_docs: int, top_k: int):
+        """Top_k rows and scores for one sparse query, skipping full scans of low-impact terms (MaxScore)"""
+
+        offsets = postings["offsets"]
+        bounds = weights * postings["max_weights"][terms]
+        order = np.argsort(-bounds, kind="stable")
+        terms, weights, bounds = terms[order], weights[order], bounds[order]
+        # best score a doc unseen before term i can still reach
+        remaining = np.cumsum(bounds[::-1])[::-1]
+        acc = np.zeros(n_docs, dtype=np.float32)
+        in_top = np.zeros(n_docs, dtype=bool)
+        top = None  # current top_k docs, tracked once pruning becomes possible
+        threshold = -np.inf
+        n_essential = len(terms)
+        for i, (term, weight) in enumerate(zip(terms, weights)):
+            # the k-th best partial score can only exceed remaining[i] once enough bound is spent
+            if 0 < i and remaining[i] < remaining[0] - remaining[i]:
+                if top is None:
+                    touched = np.flatnonzero(acc)
+                    top = touched[top_k_rows(acc[touched][None, :], top_k)[0][0]]
+                if len(top) == top_k:
+                    threshold = acc[top].min()
+                    if remaining[i] < threshold:
+                        n_essential = i
+                        break
+            postings_slice = slice(offsets[term], offsets[term + 1])
+            docs = postings["docs"][postings_slice]
+            acc[docs] += postings["weights"][postings_slice] * weight
+            if (
+                top is not None
+            ):  # acc only grows: the new top_k is among the old one and docs
+                in_top[top] = True
+                candidates = np.concatenate([top, docs[~in_top[docs]]])
+                in_top[top] = False
+                top = candidates[top_k_rows(acc[candidates][None, :], top_k)[0][0]]
+        if n_essential < len(terms):
+            # only docs already seen can still reach the top_k; look the rest of the terms up for them
+            candidates = np.flatnonzero(acc + remaining[n_essential] >= threshold)
+            for j in range(n_essential, len(terms)):
+                candidates = candidates[acc[candidates] + remaining[j] >= threshold]
+                postings_slice = slice(offsets[terms[j]], offsets[terms[j] + 1])
+                docs = postings["docs"][postings_slice]
+                if len(docs) <= 16 * len(
+                    candidates
+                ):  # scanning is cheaper than lookups
+                    acc[docs] += postings["weights"][postings_slice] * weights[j]
+                    continue
+                pos = np.searchsorted(docs, candidates).clip(max=len(docs) - 1)
+                hit = docs[pos] == candidates
+                acc[candidates[hit]] += (
+                    postings["weights"][postings_slice.start + pos[hit]] * weights[j]
+                )
+            return top_k_columns(candidates, acc[candidates], top_k, n_docs)
+        candidates = np.flatnonzero(acc)
+        return top_k_columns(candidates, acc[candidates], top_k, n_docs)
+
+    def query_terms(self, ns, sparse_queries, i: int):
+        """Terms and weights of query row i that exist in the namespace vocabulary"""
+
+        row = sparse_queries[i]
+        keep = row.indices < len(ns["postings"]["offsets"]) - 1
+        return row.indices[keep].astype(np.int64), row.data[keep].astype(np.float32)
+
+    def search_batch(self, ns, dense, sparse_queries, top_k: int):
+        """Postings-based sparse scores, fused with brute-force dense scores for hybrid queries"""
+
+        if sparse_queries is None or not sparse_queries.nnz:  # dense-only
+            return super().search_batch(ns, dense, None, top_k)
+        postings = ns["postings"]
+        if dense is None and self.pruning:  # sparse-only, one query at a time
+            ls_rows, ls_scores = [], []
+            for i in range(sparse_queries.shape[0]):
+                terms, weights = self.query_terms(ns, sparse_queries, i)
+                rows, scores = self.max_score(
+                    postings, terms, weights, len(ns["ids"]), top_k
+                )
+                ls_rows.append(rows)
+                ls_scores.append(scores)
+            return ls_rows, ls_scores
+        # scan the postings of every query term of the batch at once (term-at-a-time, in scipy)
+        sparse_scores = sparse_queries @ postings["matrix"]
+        if dense is None:  # sparse-only: the dense matrix is never read
+            return top_k_sparse_rows(sparse_scores, top_k)
+        scores = sparse_scores.toarray()
+        scores += dense @ ns["dense"].T
+        return top_k_rows(scores, top_k)
+
+
+class InvertedHybridStore(ExactHybridStore):
+    """Drop-in for the pinecone module returned by connect_to_pinecone, holding one InvertedHybridIndex per folder."""
+
+    def __init__(
+        self, dirpath=None, pruning: bool = False, query_batch_size: int = 256
+    ) -> None:
+        super().__init__(dirpath or DEFAULT_DIRPATH, query_batch_size)
+        self.pruning = pruning
+
+    def list_indexes(self) -> list:
+        return sorted(
+            fp.parent.name
+            for fp in self.dirpath.glob("*/index.json")
+            if json.loads(fp.read_text()).get("inverted")
+        )
+
+    @log(msg="Building inverted hybrid index from UMLS embeddings")
+    def build_index(
+        self, name, df_embeddings, embed_columns, metadata_columns, dimension, metric
+    ) -> InvertedHybridIndex:
+        ExactHybridIndex.build(
+            self.dirpath / name,
+            df_embeddings,
+            embed_columns,
+            metadata_columns,
+            dimension,
+            metric,
+        )
+        InvertedHybridIndex.build_postings(self.dirpath / name)
+        return self.Index(name)
+
+    def Index(self, index_name) -> InvertedHybridIndex:
+        if index_name not in self.list_indexes():
+            raise ValueError(
+                f"Inverted index '{index_name}' not found in {self.dirpath}"
+            )
+        return InvertedHybridIndex(
+            self.dirpath / index_name, self.pruning, self.query_batch_size
+        )
@@ -9,14 +9,13 @@ from pathlib import Path
 
 from ddcuimap.umls import umls_logger, log, copy_log
 import ddcuimap.utils.helper as helper
+from ddcuimap.utils.checkpoint import ResultsJournal
 import ddcuimap.curation.utils.process_data_dictionary as proc_dd
 import ddcuimap.curation.utils.curation_functions as cur
+import ddcuimap.curation.utils.deduplication as dedup
 
 # UMLS API
-from ddcuimap.umls.utils.api_connection import (
-    check_credentials,
-    connect_to_umls,
-)
+from ddcuimap.umls.utils.api_connection import check_credentials
 from ddcuimap.umls.utils.runner import umls_runner
 
 cfg = helper.compose_config(overrides=["custom=de", "apis=config_umls_api"])
@@ -25,13 +24,22 @@ cfg = helper.compose_config(overrides=["custom=de", "apis=config_umls_api"])
 @log(msg="Running UMLS API Search - batch_query_pipeline")
 def run_umls_batch(cfg, **kwargs):
     # API CONNECTION
-    check_credentials(cfg)
-    response = connect_to_umls(cfg)
+    if cfg.apis.umls.api_settings.get("backend", "api") == "local":
+        umls_logger.warning(
+            "Local UMLS backend selected. Skipping UMLS API connection."
+        )
+    else:
+        check_credentials(cfg)  # connection is checked on the first uncached query
 
     # INPUTS/OUTPUTS
     df_dd = kwargs.get("df_dd")
     dir_step1 = kwargs.get("dir_step1")
     df_dd_preprocessed = kwargs.get("df_dd_preprocessed")
+    checkpoint = cfg.apis.umls.api_settings.checkpoint
+    if checkpoint.resume_dirpath:
+        # RESUME INTERRUPTED RUN IN EXISTING STEP 1 DIRECTORY
+        umls_logger.warning(f"Resuming UMLS API search in {checkpoint.resume_dirpath}")
+        dir_step1 = Path(checkpoint.resume_dirpath)
     if df_dd is None or df_dd.empty:
         # LOAD DATA DICTIONARY FILE
         df_dd, fp_dd = proc_dd.load_data_dictionary(cfg)
@@ -55,6 +63,9 @@ def run_umls_batch(cfg, **kwargs):
         df_dd, df_dd_preprocessed, cfg.custom.settings.pipeline_name, cfg
     )
 
+    # DEDUPLICATE QUERY TERMS
+    df_curation_query, df_dedup_map = dedup.deduplicate_query_terms(df_curation, cfg)
+
     # PREPARE UMLS QUERY RESULTS DATAFRAME FORMAT
     df_results = pd.DataFrame(
         columns=cfg.custom.curation_settings.query_columns
@@ -62,7 +73,14 @@ def run_umls_batch(cfg, **kwargs):
     )
 
     # RUN UMLS API SEARCH
-    df_results = umls_runner(df_results, df_curation, cfg)
+    journal = None
+    if checkpoint.enabled:
+        journal = ResultsJournal(
+            Path(dir_step1) / "umls-search_journal.jsonl",
+            resume=bool(checkpoint.resume_dirpath),
+        )
+    df_results = umls_runner(df_results, df_curation_query, cfg, journal=journal)
+    df_results = dedup.fan_out_results(df_results, df_dedup_map, cfg)
 
     # CREATE CURATION FILE
     df_final = cur.create_curation_file(
@@ -0,0 +1,2 @@
+# from get_version import get_version
+# __version__ = get_version(__file__)
@@ -1,9 +1,9 @@
 import os
 
-import requests
 from dotenv import load_dotenv
 
 from ddcuimap.umls import umls_logger, log
+from ddcuimap.utils import http_session
 
 load_dotenv()
 
@@ -48,7 +48,8 @@ def connect_to_umls(cfg):
 
     payload = f"apikey={cfg.apis.umls.user_info.apiKey}"
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    response = requests.request(
+    session = http_session.configure_session(cfg.get("http_session"))
+    response = session.request(
         "POST", cfg.apis.umls.api_settings.url, headers=headers, data=payload
     )
     umls_logger.info(f"Response status: {response.status_code}")
@@ -0,0 +1,243 @@
+"""
+
+Offline UMLS search backend built from MRCONSO.RRF.
+
+Answers the same queries as the UMLS REST search endpoint (string, searchType, sabs, pageNumber, pageSize) using
+exact-string and word/normalized-word inverted indexes, so umls_runner can run with no network, API key or rate limit.
+
+"""
+
+import pickle
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ddcuimap.umls import umls_logger, log
+
+MRCONSO_COLUMNS = [
+    "CUI",
+    "LAT",
+    "TS",
+    "LUI",
+    "STT",
+    "SUI",
+    "ISPREF",
+    "AUI",
+    "SAUI",
+    "SCUI",
+    "SDUI",
+    "SAB",
+    "TTY",
+    "CODE",
+    "STR",
+    "SRL",
+    "SUPPRESS",
+    "CVF",
+    "",
+]
+MRCONSO_USECOLS = ["CUI", "LAT", "TS", "STT", "ISPREF", "SAB", "STR", "SUPPRESS"]
+NORM_STOPWORDS = {
+    "a",
+    "an",
+    "and",
+    "by",
+    "for",
+    "in",
+    "nos",
+    "of",
+    "on",
+    "or",
+    "the",
+    "to",
+    "with",
+}
+SEARCH_TYPES = ["exact", "words", "normalizedString", "normalizedWords"]
+PREFERRED = {"TS": "P", "STT": "PF", "ISPREF": "Y"}
+
+
+# TEXT NORMALIZATION
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word tokens with punctuation removed"""
+
+    return re.findall(r"[^\W_]+", str(text).casefold())
+
+
+def uninflect(token: str) -> str:
+    """Cheap plural/genitive removal approximating UMLS word normalization"""
+
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("ses", "xes", "zes", "ches", "shes")):
+        return token[:-2]
+    if (
+        len(token) > 3
+        and token.endswith("s")
+        and not token.endswith(("ss", "us", "is"))
+    ):
+        return token[:-1]
+    return token
+
+
+def normalize_words(text: str) -> list:
+    """Normalized word tokens (lowercase, no punctuation/stopwords, uninflected)"""
+
+    return [uninflect(tok) for tok in tokenize(text) if tok not in NORM_STOPWORDS]
+
+
+def normalize_string(text: str) -> str:
+    """Order-independent normalized string"""
+
+    return " ".join(sorted(normalize_words(text)))
+
+
+def postings_from_lists(token_lists: pd.Series) -> dict:
+    """Build {token: sorted unique atom positions} from a series of token lists"""
+
+    tokens = token_lists.explode().dropna()
+    atom_ids = tokens.index.to_numpy(dtype=np.int64)
+    groups = pd.Series(atom_ids).groupby(tokens.to_numpy()).indices
+    return {token: np.unique(atom_ids[pos]) for token, pos in groups.items()}
+
+
+class LocalUMLSIndex:
+    """Models an in-memory inverted index over MRCONSO atoms that mimics the UMLS search endpoint."""
+
+    def __init__(self, df_conso: pd.DataFrame) -> None:
+        df_conso = df_conso.reset_index(drop=True)
+        self.cui = df_conso["CUI"].to_numpy(dtype=object)
+        self.sab = df_conso["SAB"].to_numpy(dtype=object)
+        preferred = df_conso.sort_values(
+            ["TS", "STT", "ISPREF"], key=lambda col: col.ne(PREFERRED[col.name])
+        ).drop_duplicates(
+            "CUI"
+        )  # first P/PF/Y atom per CUI, else first atom
+        self.preferred_name = dict(zip(preferred["CUI"], preferred["STR"]))
+        strings = df_conso["STR"].astype(str)
+        words = strings.map(tokenize)
+        norm_words = strings.map(normalize_words)
+        self.n_words = norm_words.map(len).to_numpy(dtype=np.int32)
+        self.exact = pd.Series(df_conso.index).groupby(strings.str.casefold()).indices
+        self.normalized_string = (
+            pd.Series(df_conso.index)
+            .groupby(norm_words.map(lambda x: " ".join(sorted(x))))
+            .indices
+        )
+        self.words = postings_from_lists(words)
+        self.normalized_words = postings_from_lists(norm_words)
+        umls_logger.info(
+            f"Built local UMLS index: {len(self.cui)} atoms, {len(self.preferred_name)} CUIs."
+        )
+
+    @classmethod
+    @log(msg="Building local UMLS index from MRCONSO.RRF")
+    def from_rrf(cls, fp_mrconso, languages=("ENG",), include_suppressible=False):
+        """Read MRCONSO.RRF (optionally filtered by LAT and SUPPRESS) and index it"""
+
+        df_conso = pd.read_csv(
+            fp_mrconso,
+            sep="|",
+            header=None,
+            names=MRCONSO_COLUMNS,
+            usecols=MRCONSO_USECOLS,
+            dtype=str,
+            quoting=3,  # RRF fields are never quoted
+            na_filter=False,
+        )
+        if languages:
+            df_conso = df_conso[df_conso["LAT"].isin(languages)]
+        if not include_suppressible:
+            df_conso = df_conso[df_conso["SUPPRESS"] == "N"]
+        return cls(df_conso)
+
+    def save(self, filepath) -> None:
+        with open(filepath, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    @log(msg="Loading local UMLS index")
+    def load(filepath):
+        with open(filepath, "rb") as f:
+            return pickle.load(f)
+
+    def match_atoms(self, string: str, searchType: str) -> np.ndarray:
+        """Return positions of atoms matching string for a searchType"""
+
+        if searchType == "exact":
+            return self.exact.get(str(string).casefold(), np.empty(0, dtype=np.int64))
+        if searchType == "normalizedString":
+            return self.normalized_string.get(
+                normalize_string(string), np.empty(0, dtype=np.int64)
+            )
+        if searchType == "words":
+            postings, tokens = self.words, tokenize(string)
+        elif searchType == "normalizedWords":
+            postings, tokens = self.normalized_words, normalize_words(string)
+        else:
+            raise ValueError(
+                f"searchType '{searchType}' is not supported by the local UMLS backend (use one of {SEARCH_TYPES})"
+            )
+        if not tokens:
+            return np.empty(0, dtype=np.int64)
+        lists = sorted(
+            (postings.get(tok, np.empty(0, dtype=np.int64)) for tok in set(tokens)),
+            key=len,
+        )
+        atoms = lists[0]
+        for other in lists[1:]:
+            if not len(atoms):
+                break
+            atoms = np.intersect1d(atoms, other, assume_unique=True)
+        return atoms
+
+    def search(
+        self, string, searchType="exact", sabs=None, pageNumber=1, pageSize=25, **kwargs
+    ) -> dict:
+        """Return UMLS search endpoint style {'recCount', 'results'} for a query"""
+
+        atoms = self.match_atoms(string, searchType)
+        if sabs:
+            if isinstance(sabs, str):
+                sabs = sabs.split(",")
+            atoms = atoms[np.isin(self.sab[atoms], list(sabs))]
+        atoms = atoms[
+            np.argsort(self.n_words[atoms], kind="stable")
+        ]  # closest matches (fewest extra words) first
+        _, first = np.unique(self.cui[atoms], return_index=True)
+        atoms = atoms[np.sort(first)]  # one result per CUI
+        pageNumber, pageSize = int(pageNumber or 1), int(pageSize or 25)
+        page = atoms[(pageNumber - 1) * pageSize : pageNumber * pageSize]
+        results = [
+            {
+                "ui": self.cui[i],
+                "name": self.preferred_name[self.cui[i]],
+                "rootSource": self.sab[i],
+            }
+            for i in page
+        ]
+        return {"recCount": len(atoms), "results": results}
+
+
+@log(msg="Loading local UMLS search backend")
+def load_local_index(local_settings):
+    """Load pickled local index or build it from MRCONSO.RRF (and save it if filepath_index is set)"""
+
+    fp_index = local_settings.filepath_index
+    if fp_index and Path(fp_index).exists():
+        return LocalUMLSIndex.load(fp_index)
+    if not local_settings.dirpath_mth:
+        raise ValueError(
+            "Set apis.umls.api_settings.local.dirpath_mth (or filepath_index) to use the local UMLS backend."
+        )
+    index = LocalUMLSIndex.from_rrf(
+        Path(local_settings.dirpath_mth) / "MRCONSO.RRF",
+        languages=list(local_settings.languages or []),
+        include_suppressible=local_settings.include_suppressible,
+    )
+    if fp_index:
+        index.save(fp_index)
+        umls_logger.info(f"Saved local UMLS index to {fp_index}")
+    return index
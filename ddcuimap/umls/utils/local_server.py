@@ -0,0 +1,204 @@
+"""
+
+Local stand-in for the UMLS REST search endpoint backed by LocalUMLSIndex.
+
+Serves /rest/search/{version} (string, searchType, sabs, pageNumber, pageSize with recCount pagination) in the
+UMLS response shape plus the /cas/v1/api-key credential check, with injectable latency, 429s and 5xx errors so
+the concurrent runner, response cache and retries can be benchmarked reproducibly without credentials. Uses the
+bundled ddcuimap/umls/resources/MRCONSO_sample.RRF fixture unless another MRCONSO.RRF is given.
+
+    python -m ddcuimap.umls.utils.local_server --port 8082 --latency 0.05 --rate_429 0.02 --rate_5xx 0.01
+
+then point the UMLS config at it:
+
+    apis.umls.api_settings.fullpath=http://127.0.0.1:8082/rest/search/current
+    apis.umls.api_settings.url=http://127.0.0.1:8082/cas/v1/api-key
+
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from ddcuimap.umls import umls_logger
+from ddcuimap.umls.utils.local_search import LocalUMLSIndex
+
+FP_MRCONSO_SAMPLE = Path(__file__).parents[1] / "resources" / "MRCONSO_sample.RRF"
+SEARCH_PATH = "/rest/search/"
+API_KEY_PATH = "/cas/v1/api-key"
+
+
+class LocalUMLSServer(ThreadingHTTPServer):
+    """Models the UMLS REST search endpoint over a LocalUMLSIndex in a threaded HTTP server."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        index: LocalUMLSIndex = None,
+        host: str = "127.0.0.1",
+        port: int = 8082,
+        latency: float = 0.0,
+        rate_429: float = 0.0,
+        rate_5xx: float = 0.0,
+        retry_after: float = 0,
+        seed: int = 0,
+    ) -> None:
+        super().__init__((host, port), LocalUMLSRequestHandler)
+        self.index = index or LocalUMLSIndex.from_rrf(FP_MRCONSO_SAMPLE)
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.counts = {"search": 0, "429": 0, "5xx": 0}
+        self._rng = random.Random(seed)  # same seed -> same sequence of injected errors
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def fullpath(self) -> str:
+        return f"{self.url}{SEARCH_PATH}current"
+
+    @property
+    def api_key_url(self) -> str:
+        return f"{self.url}{API_KEY_PATH}"
+
+    def draw_error(self):
+        """Returns 429, 503 or None according to the injected error rates"""
+        with self._lock:
+            draw = self._rng.random()
+            if draw < self.rate_429:
+                self.counts["429"] += 1
+                return 429
+            if draw < self.rate_429 + self.rate_5xx:
+                self.counts["5xx"] += 1
+                return 503
+            self.counts["search"] += 1
+        return None
+
+    def start(self) -> "LocalUMLSServer":
+        """Serve in a background daemon thread"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        umls_logger.info(f"Local UMLS REST stand-in listening on {self.url}")
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class LocalUMLSRequestHandler(BaseHTTPRequestHandler):
+    """Handles UMLS search GETs and api-key POSTs for LocalUMLSServer."""
+
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes: without TCP_NODELAY, keep-alive requests stall ~40 ms on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args) -> None:
+        pass  # keep benchmark output clean
+
+    def send_json(self, status: int, data: dict, headers=None) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if urlparse(self.path).path != API_KEY_PATH:
+            return self.send_json(404, {"error": "Not found"})
+        if not parse_qs(body.decode()).get("apikey"):
+            return self.send_json(401, {"error": "apikey missing"})
+        self.send_json(
+            201, {}, {"Location": f"{self.server.url}/cas/v1/tickets/TGT-local"}
+        )
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if not url.path.startswith(SEARCH_PATH):
+            return self.send_json(404, {"error": "Not found"})
+        query = parse_qs(url.query)
+        params = {key: values[-1] for key, values in query.items()}
+        params["sabs"] = ",".join(query.get("sabs", []))  # repeated or comma-separated
+        if not params.get("apiKey"):
+            return self.send_json(401, {"error": "apiKey missing"})
+        server = self.server
+        time.sleep(server.latency)
+        status = server.draw_error()
+        if status == 429:
+            return self.send_json(
+                429,
+                {"error": "Too Many Requests"},
+                {"Retry-After": str(server.retry_after)},
+            )
+        if status:
+            return self.send_json(status, {"error": "Service Unavailable"})
+        try:
+            result = server.index.search(
+                params.get("string", ""),
+                searchType=params.get("searchType", "words"),
+                sabs=params.get("sabs"),
+                pageNumber=params.get("pageNumber") or 1,
+                pageSize=params.get("pageSize") or 25,
+            )
+        except ValueError as e:  # unsupported searchType
+            return self.send_json(400, {"error": str(e)})
+        for item in result["results"]:
+            item["uri"] = f"{server.url}/rest/content/current/CUI/{item['ui']}"
+        self.send_json(
+            200,
+            {
+                "pageSize": int(params.get("pageSize") or 25),
+                "pageNumber": int(params.get("pageNumber") or 1),
+                "result": {"classType": "searchResults", **result},
+            },
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="local UMLS REST search stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--fp_mrconso", default=str(FP_MRCONSO_SAMPLE))
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per request"
+    )
+    parser.add_argument("--rate_429", type=float, default=0.0)
+    parser.add_argument("--rate_5xx", type=float, default=0.0)
+    parser.add_argument("--retry_after", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    server = LocalUMLSServer(
+        LocalUMLSIndex.from_rrf(args.fp_mrconso),
+        args.host,
+        args.port,
+        latency=args.latency,
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    umls_logger.info(f"Local UMLS REST stand-in listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -6,8 +6,10 @@ Used by batch_hybrid_query_pipeline.py to iterate through each row in the curati
 
 """
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import pandas as pd
+from omegaconf import OmegaConf
 from tqdm import tqdm
 
 from ddcuimap.curation.utils.text_processing import check_query_terms_valid
@@ -17,125 +19,196 @@ from ddcuimap.umls import umls_logger, log
 
 
 @log(msg="Running UMLS Runner")
-def umls_runner(df_results, df_curation, cfg):
+def umls_runner(df_results, df_curation, cfg, journal=None):
     cfg.apis.umls.query_params.apiKey = cfg.apis.umls.user_info.apiKey
-    cnt_searchTerm = 0
-    search_ID = 0
-    for idx_row, row in tqdm(
-        df_curation.iterrows(), total=df_curation.shape[0], desc="UMLS Runner"
-    ):
-        """
-        Cycle through each row in df_curation and query UMLS API with each query term in the row.
-        """
-        search_ID += 1
-        vn = row[cfg.custom.data_dictionary_settings.variable_column]  # variable name
-        umls_logger.info(f"Querying search_ID [{search_ID}]: {vn}")
-        query_terms_dict = {
-            col: row[col]
-            for col in df_curation.columns
-            if re.search(r"query_term_\d+", col)
+    uqproc.configure_api_client(cfg)
+    columns = list(df_results.columns)
+    query_terms_cols = [
+        col for col in df_curation.columns if re.search(r"query_term_\d+", col)
+    ]
+    rows = [
+        (int(row.get("search_ID", search_ID)), row)
+        for search_ID, (_, row) in enumerate(df_curation.iterrows(), start=1)
+    ]  # use search_ID column so deduplicated curation dataframes keep their IDs
+    max_workers = cfg.apis.umls.api_settings.concurrency.max_workers
+    row_results = {}
+    if journal is not None:  # skip search_IDs already completed in a previous run
+        search_IDs = {search_ID for search_ID, _ in rows}
+        row_results = {
+            search_ID: records
+            for search_ID, records in journal.load().items()
+            if search_ID in search_IDs
+        }
+        if row_results:
+            umls_logger.warning(
+                f"Resuming UMLS Runner: skipping {len(row_results)} of {len(rows)} completed search_IDs."
+            )
+    rows_pending = [
+        (search_ID, row) for search_ID, row in rows if search_ID not in row_results
+    ]
+    if max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    search_row_journaled,
+                    row,
+                    search_ID,
+                    query_terms_cols,
+                    columns,
+                    cfg,
+                    journal,
+                ): search_ID
+                for search_ID, row in rows_pending
+            }
+            try:
+                for future in tqdm(
+                    as_completed(futures), total=len(futures), desc="UMLS Runner"
+                ):
+                    row_results[futures[future]] = future.result()
+            except BaseException:
+                # rows already running finish (and are journaled) before re-raising
+                for pending in futures:
+                    pending.cancel()  # same as shutdown(cancel_futures=True), on python 3.8 too
+                raise
+    else:
+        for search_ID, row in tqdm(
+            rows_pending, total=len(rows_pending), desc="UMLS Runner"
+        ):
+            row_results[search_ID] = search_row_journaled(
+                row, search_ID, query_terms_cols, columns, cfg, journal
+            )
+    records = [
+        record for search_ID, _ in rows for record in row_results[search_ID]
+    ]  # assemble in search_ID order regardless of completion order
+    df_records = pd.DataFrame.from_records(records, columns=columns)
+    if df_results.empty:
+        df_results = df_records
+    else:
+        df_results = pd.concat([df_results, df_records], ignore_index=True)
+    uqproc.log_cache_stats()
+
+    return df_results
+
+
+def query_search_types(query_params, searchTypes, cfg) -> dict:
+    """Query every searchType for a query term at once and return {searchType: (query_params, jsonData)}"""
+
+    fullpath = cfg.apis.umls.api_settings.fullpath
+    params = {
+        searchType: uqproc.modify_query_params(
+            dict(query_params), searchType=searchType
+        )
+        for searchType in searchTypes
+    }
+    with ThreadPoolExecutor(max_workers=len(searchTypes)) as executor:
+        futures = {
+            searchType: executor.submit(
+                uqproc.query_umls_api, fullpath, params[searchType]
+            )
+            for searchType in searchTypes
+        }
+        return {
+            searchType: (params[searchType], future.result())
+            for searchType, future in futures.items()
         }
-        for key, val in query_terms_dict.items():
-            cnt_searchTerm += 1
-            searchTermCol = key
-            searchTerm = val
-            searchType = cfg.apis.umls.api_settings.searchType1
-            pageNumber = 1
-            if check_query_terms_valid(searchTerm):  # check if query term is valid
-                query_params = uqproc.modify_query_params(
-                    cfg.apis.umls.query_params,
-                    string=searchTerm,
-                    searchType=searchType,
-                    pageNumber=pageNumber,
-                )
-                jsonData = uqproc.query_umls_api(
-                    cfg.apis.umls.api_settings.fullpath, query_params
-                )  # query API
+
+
+def search_row_journaled(row, search_ID, query_terms_cols, columns, cfg, journal):
+    """search_row that journals the records as soon as the row completes (in the worker thread)"""
+
+    records = search_row(row, search_ID, query_terms_cols, columns, cfg)
+    if journal is not None:
+        journal.append(search_ID, records)
+    return records
+
+
+def search_row(row, search_ID, query_terms_cols, columns, cfg):
+    """
+    Query UMLS API with each query term in a df_curation row and return the records (dicts) to add to df_results.
+    """
+    records = []
+    cnt_searchTerm = 0
+    searchTypes = uqproc.get_search_types(cfg)
+    parallel = cfg.apis.umls.api_settings.get("searchTypes_parallel", False)
+    vn = row[cfg.custom.data_dictionary_settings.variable_column]  # variable name
+    umls_logger.info(f"Querying search_ID [{search_ID}]: {vn}")
+    query_terms_dict = {col: row[col] for col in query_terms_cols}
+    for key, val in query_terms_dict.items():
+        cnt_searchTerm += 1
+        searchTermCol = key
+        searchTerm = val
+        pageNumber = 1
+        if check_query_terms_valid(searchTerm):  # check if query term is valid
+            query_params = uqproc.modify_query_params(
+                OmegaConf.to_container(cfg.apis.umls.query_params, resolve=True),
+                string=searchTerm,
+                pageNumber=pageNumber,
+            )  # copy per query term so parallel rows don't share params
+            if parallel and len(searchTypes) > 1:
+                responses = query_search_types(query_params, searchTypes, cfg)
+            found = False
+            for e, searchType in enumerate(searchTypes):
+                if parallel and len(searchTypes) > 1:
+                    query_params, jsonData = responses[searchType]
+                else:
+                    query_params = uqproc.modify_query_params(
+                        dict(query_params), searchType=searchType
+                    )
+                    jsonData = uqproc.query_umls_api(
+                        cfg.apis.umls.api_settings.fullpath, query_params
+                    )  # query API
                 recCount = jsonData["recCount"]
-                if (
-                    recCount
-                ):  # if recCount is not 0, results were found with default exact search
+                if recCount:  # if recCount is not 0, results were found with searchType
+                    if e > 0:
+                        cnt_searchTerm += 1
                     umls_logger.info(
                         f"({cnt_searchTerm}) {searchTerm}: {recCount} {searchType} matches."
                     )
                     df_results_cols = uqproc.process_query_results(
                         jsonData, query_params, cfg
                     )
-                    df_query_cols = pd.DataFrame(
-                        [[vn, search_ID, searchTerm, searchTermCol, searchType]]
-                        * df_results_cols.shape[0],
-                        columns=cfg.custom.curation_settings.query_columns,
-                    )
-                    df_temp = pd.concat([df_query_cols, df_results_cols], axis=1)
-                    df_results = pd.concat([df_results, df_temp], ignore_index=True)
-                    if cfg.custom.data_dictionary_settings.search_all_query_terms:
-                        continue  # if search_all_cols is True, continue to next query term for the same row if it exists
-                    else:
-                        break  # if search_all_cols is False, break out of loop and move to next row
-                else:  # for cases where the 'exact' search type results in an empty list
-                    umls_logger.warning(
-                        f"({cnt_searchTerm}) {searchTerm}: No exact match. Trying alternative searchType."
-                    )
-                    temp_ls = uqproc.no_results_output(
-                        vn, search_ID, searchTerm, searchTermCol, searchType
-                    )
-                    df_temp = pd.DataFrame(
-                        dict(zip(df_results.columns, temp_ls)), index=[0]
-                    )
-                    df_results = pd.concat([df_results, df_temp], ignore_index=True)
-                    searchType = (
-                        cfg.apis.umls.api_settings.searchType2
-                    )  # TODO: make stack to allow for iterating over multiple searchTypes
-                    query_params = uqproc.modify_query_params(
-                        cfg.apis.umls.query_params, searchType=searchType
-                    )
-                    jsonData = uqproc.query_umls_api(
-                        cfg.apis.umls.api_settings.fullpath, query_params
-                    )  # query API
-                    recCount = jsonData["recCount"]
-                    if (
-                        recCount
-                    ):  # if recCount is not 0, results were found with approximate search
-                        cnt_searchTerm += 1
-                        umls_logger.info(
-                            f"({cnt_searchTerm}) {searchTerm}: {recCount} {searchType} matches."
-                        )
-                        df_results_cols = uqproc.process_query_results(
-                            jsonData, query_params, cfg
+                    records.extend(
+                        query_results_records(
+                            [vn, search_ID, searchTerm, searchTermCol, searchType],
+                            df_results_cols,
+                            cfg,
                         )
-                        df_query_cols = pd.DataFrame(
-                            [[vn, search_ID, searchTerm, searchTermCol, searchType]]
-                            * df_results_cols.shape[0],
-                            columns=cfg.custom.curation_settings.query_columns,
+                    )
+                    found = True
+                    break  # keep highest-priority searchType with results
+                else:  # searchType results in an empty list, try next searchType if available
+                    if e < len(searchTypes) - 1:
+                        umls_logger.warning(
+                            f"({cnt_searchTerm}) {searchTerm}: No {searchType} match. Trying alternative searchType."
                         )
-                        df_temp = pd.concat([df_query_cols, df_results_cols], axis=1)
-                        df_results = pd.concat([df_results, df_temp], ignore_index=True)
-                        if cfg.custom.data_dictionary_settings.search_all_query_terms:
-                            continue
-                        else:
-                            break
-                    else:  # if approximate search still results in nothing, try next query_term if available
+                    else:
                         umls_logger.warning(
                             f"({cnt_searchTerm}) {searchTerm}: No alternative searchType match. Moving on to next query term option if available."
                         )
-                        temp_ls = uqproc.no_results_output(
-                            vn, search_ID, searchTerm, searchTermCol, searchType
-                        )
-                        df_temp = pd.DataFrame(
-                            dict(zip(df_results.columns, temp_ls)), index=[0]
-                        )
-                        df_results = pd.concat([df_results, df_temp], ignore_index=True)
-                        continue
-            else:  # if query term is not valid, try next query term if available
-                umls_logger.warning(
-                    f"({cnt_searchTerm}) {searchTerm}: Is nan or empty. Trying next query term option if available."
-                )
-                results_ls = uqproc.invalid_query_term_output(
-                    vn, search_ID, searchTerm, searchTermCol
-                )
-                df_temp = pd.DataFrame(
-                    dict(zip(df_results.columns, results_ls)), index=[0]
-                )
-                df_results = pd.concat([df_results, df_temp], ignore_index=True)
+                    temp_ls = uqproc.no_results_output(
+                        vn, search_ID, searchTerm, searchTermCol, searchType
+                    )
+                    records.append(dict(zip(columns, temp_ls)))
+            if found and not cfg.custom.data_dictionary_settings.search_all_query_terms:
+                break  # if search_all_cols is False, break out of loop and move to next row
+            continue  # otherwise continue to next query term for the same row if it exists
+        else:  # if query term is not valid, try next query term if available
+            umls_logger.warning(
+                f"({cnt_searchTerm}) {searchTerm}: Is nan or empty. Trying next query term option if available."
+            )
+            results_ls = uqproc.invalid_query_term_output(
+                vn, search_ID, searchTerm, searchTermCol
+            )
+            records.append(dict(zip(columns, results_ls)))
 
-    return df_results
+    return records
+
+
+def query_results_records(query_values, df_results_cols, cfg):
+    """Combine query column values with each processed UMLS result into records"""
+
+    query_columns = list(cfg.custom.curation_settings.query_columns)
+    return [
+        {**dict(zip(query_columns, query_values)), **result}
+        for result in df_results_cols.to_dict("records")
+    ]
@@ -4,13 +4,140 @@ This module contains functions for processing UMLS API queries.
 
 """
 
+import hashlib
 import json
 import math
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 import pandas as pd
-import requests
+from omegaconf import OmegaConf
 
-from ddcuimap.umls import log
+from ddcuimap.umls import umls_logger, log
+from ddcuimap.umls.utils.api_connection import connect_to_umls
+from ddcuimap.utils import http_session
+from ddcuimap.utils.rate_limiter import RateLimiter
+from ddcuimap.utils.sqlite_cache import SQLiteCache, DEFAULT_CACHE_DIR
+
+# API CLIENT STATE (set by configure_api_client)
+
+rate_limiter = None
+response_cache = None
+umls_version = "current"
+local_index = None
+local_index_settings = None  # api_settings.local the local index was loaded with
+connection_cfg = None  # set until the connection is checked on the first uncached query
+connection_lock = threading.Lock()
+
+
+def get_search_types(cfg) -> list:
+    """Return ordered searchType fallback stack (supports legacy searchType1/searchType2 configs)"""
+
+    api_settings = cfg.apis.umls.api_settings
+    if api_settings.get("searchTypes"):
+        return list(api_settings.searchTypes)
+    return [api_settings.searchType1, api_settings.searchType2]
+
+
+@log(msg="Configuring UMLS API client")
+def configure_api_client(cfg):
+    """Set up HTTP session, rate limiting and response caching shared by every UMLS API query"""
+
+    global rate_limiter, response_cache, umls_version, connection_cfg
+    global local_index, local_index_settings
+    if cfg.apis.umls.api_settings.get("backend", "api") == "local":
+        from ddcuimap.umls.utils.local_search import load_local_index, SEARCH_TYPES
+
+        unsupported = [t for t in get_search_types(cfg) if t not in SEARCH_TYPES]
+        if unsupported:  # fail before the run rather than on the first query
+            raise ValueError(
+                f"searchTypes {unsupported} are not supported by the local UMLS backend (use any of {SEARCH_TYPES})"
+            )
+        local_settings = OmegaConf.to_container(
+            cfg.apis.umls.api_settings.local, resolve=True
+        )
+        if local_index is None or local_settings != local_index_settings:
+            local_index = load_local_index(cfg.apis.umls.api_settings.local)
+            local_index_settings = local_settings
+        umls_logger.warning("Using local UMLS search backend (no UMLS API requests).")
+        return
+    local_index = None
+    connection_cfg = cfg  # a fully cached run makes no UMLS API requests
+    http_session.configure_session(cfg.get("http_session"))
+    concurrency = cfg.apis.umls.api_settings.concurrency
+    rate_limiter = RateLimiter(concurrency.requests_per_second)
+    umls_logger.info(
+        f"UMLS API requests capped at {concurrency.requests_per_second}/sec with {concurrency.max_workers} worker(s)."
+    )
+    umls_version = cfg.apis.umls.api_settings.version
+    cache_settings = cfg.apis.umls.api_settings.cache
+    if cache_settings.enabled:
+        fp_cache = Path(
+            cache_settings.filepath
+            or DEFAULT_CACHE_DIR.joinpath("umls_search_cache.sqlite")
+        )
+        if response_cache is None or response_cache.filepath != fp_cache:
+            response_cache = SQLiteCache(
+                fp_cache,
+                ttl_seconds=cache_settings.ttl_days * 24 * 60 * 60
+                if cache_settings.ttl_days
+                else None,
+                max_entries=cache_settings.max_entries,
+            )
+        umls_logger.info(
+            f"Using UMLS response cache: {response_cache.filepath} ({len(response_cache)} entries)"
+        )
+    else:
+        response_cache = None
+
+
+def check_connection():
+    """Connect to the UMLS API once, before the first query that is not answered from the cache"""
+
+    global connection_cfg
+    if connection_cfg is None:
+        return
+    with connection_lock:
+        if connection_cfg is not None:
+            connect_to_umls(connection_cfg)
+            connection_cfg = None
+
+
+def log_cache_stats():
+    """Log UMLS response cache hit/miss counters"""
+
+    if response_cache is not None:
+        stats = response_cache.stats()
+        umls_logger.info(
+            f"UMLS response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries."
+        )
+
+
+def normalize_query_string(string: str) -> str:
+    """Normalize query string for cache lookups (case and whitespace insensitive)"""
+
+    return re.sub(r"\s+", " ", str(string)).strip().casefold()
+
+
+def response_cache_key(query_params: dict) -> str:
+    """Create cache key from normalized string, searchType, sabs, pageNumber, pageSize and UMLS version"""
+
+    sabs = query_params.get("sabs") or []
+    if isinstance(sabs, str):
+        sabs = sabs.split(",")
+    key = json.dumps(
+        [
+            normalize_query_string(query_params.get("string")),
+            query_params.get("searchType"),
+            sorted(sabs),
+            query_params.get("pageNumber") or 1,
+            query_params.get("pageSize"),
+            umls_version,
+        ]
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
 
 
 @log(msg="Checking if query term is valid")
@@ -89,41 +216,62 @@ def pages_to_view(recCount: int, cfg) -> list:
 def query_umls_api(fullpath: str, query_params: dict) -> dict:
     """Query UMLS API and return results"""
 
-    r = requests.get(fullpath, params=query_params)
+    if local_index is not None:
+        return local_index.search(**query_params)
+    if response_cache is not None:
+        key = response_cache_key(query_params)
+        jsonData = response_cache.get(key)
+        if jsonData is not None:
+            return jsonData
+    check_connection()
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    r = http_session.get_session().get(fullpath, params=query_params)
+    r.raise_for_status()  # retries/backoff are exhausted at this point
     r.encoding = "utf-8"
     items = json.loads(r.text)
     jsonData = items["result"]
+    if response_cache is not None:
+        response_cache.set(key, jsonData)
     return jsonData
 
 
+@log(msg="Fetching additional UMLS result pages")
+def fetch_result_pages(pages: list, query_params: dict, cfg) -> list:
+    """Fetch result pages concurrently and return their results lists in page order"""
+
+    if not pages:
+        return []
+    fullpath = cfg.apis.umls.api_settings.fullpath
+    page_params = [
+        modify_query_params(dict(query_params), pageNumber=pg) for pg in pages
+    ]
+    max_workers = min(len(pages), cfg.apis.umls.api_settings.concurrency.page_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pages_json = executor.map(
+            lambda params: query_umls_api(fullpath, params), page_params
+        )
+        return [jsonData["results"] for jsonData in pages_json]
+
+
 @log(msg="Processing UMLS query results")
 def process_query_results(jsonData: dict, query_params: dict, cfg) -> pd.DataFrame:
     """Process query results"""
 
-    results = pd.DataFrame()
     recCount = int(jsonData["recCount"])
     pages = pages_to_view(recCount, cfg)
     result_columns = cfg.custom.curation_settings.result_columns
-    overall_rank = 0
-    for pg in pages:
-        if pg == 1:
-            for i, item in enumerate(jsonData["results"]):
-                results.loc[i, "recCount"] = recCount
-                overall_rank += 1
-                results.loc[i, "overall_rank"] = overall_rank
-                results.loc[i, result_columns[2]] = item["name"]
-                results.loc[i, result_columns[3]] = item["ui"]
-                results.loc[i, result_columns[4]] = item["rootSource"]
-        else:
-            query_params["pageNumber"] = pg
-            jsonData = query_umls_api(cfg.apis.umls.api_settings.fullpath, query_params)
-            offset = results.shape[0]
-            for i, item in enumerate(jsonData["results"]):
-                i_offset = i + offset
-                results.loc[i_offset, "recCount"] = recCount
-                overall_rank += 1
-                results.loc[i_offset, "overall_rank"] = overall_rank
-                results.loc[i_offset, result_columns[2]] = item["name"]
-                results.loc[i_offset, result_columns[3]] = item["ui"]
-                results.loc[i_offset, result_columns[4]] = item["rootSource"]
+    pages_results = [jsonData["results"]] + fetch_result_pages(
+        pages[1:], query_params, cfg
+    )  # page 1 is already in jsonData
+    items = [item for page_results in pages_results for item in page_results]
+    results = pd.DataFrame(
+        {
+            "recCount": [recCount] * len(items),
+            "overall_rank": range(1, len(items) + 1),
+            result_columns[2]: [item["name"] for item in items],
+            result_columns[3]: [item["ui"] for item in items],
+            result_columns[4]: [item["rootSource"] for item in items],
+        }
+    )
     return results
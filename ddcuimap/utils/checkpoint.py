@@ -0,0 +1,63 @@
+"""
+
+Append-only journal of completed search results so interrupted batch runs can be resumed.
+
+"""
+
+import json
+import threading
+from pathlib import Path
+
+from ddcuimap.utils import utils_logger
+
+
+def _json_default(obj):
+    """Convert numpy scalars (e.g., int64 search_IDs) to native python types"""
+
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+class ResultsJournal:
+    """Models a JSON Lines file with one line of result records per completed search_ID."""
+
+    def __init__(self, filepath, resume: bool = False) -> None:
+        self.filepath = Path(filepath)
+        self._lock = threading.Lock()
+        if not resume and self.filepath.exists():
+            self.filepath.unlink()  # start a fresh journal
+        elif self.filepath.exists() and self.filepath.stat().st_size:
+            with open(self.filepath, "rb+") as f:
+                f.seek(-1, 2)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")  # terminate a line cut off when the run was killed
+
+    def load(self) -> dict:
+        """Returns {search_ID: records} for every completed search_ID in the journal."""
+        completed = {}
+        if not self.filepath.exists():
+            return completed
+        with open(self.filepath, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    utils_logger.warning(
+                        f"Skipping incomplete journal line in {self.filepath.name}"
+                    )  # last line may be cut off if the run was killed mid-write
+                    continue
+                completed[int(entry["search_ID"])] = entry["records"]
+        utils_logger.info(
+            f"Loaded {len(completed)} completed search_IDs from {self.filepath}"
+        )
+        return completed
+
+    def append(self, search_ID, records: list) -> None:
+        """Appends the records of a completed search_ID and flushes them to disk."""
+        line = json.dumps(
+            {"search_ID": search_ID, "records": records}, default=_json_default
+        )
+        with self._lock:
+            with open(self.filepath, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
@@ -0,0 +1,114 @@
+"""
+
+Shared, connection-pooled HTTP session with retry/backoff used by every NLM API module.
+
+"""
+
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ddcuimap.utils import utils_logger
+
+DEFAULT_SESSION_SETTINGS = {
+    "pool_connections": 10,
+    "pool_maxsize": 20,
+    "total_retries": 5,
+    "backoff_factor": 0.5,
+    "backoff_jitter": 0.5,
+    "status_forcelist": [429, 500, 502, 503, 504],
+    # POST (e.g. SKR batch jobs) is not idempotent
+    "retry_methods": ["HEAD", "GET", "OPTIONS"],
+    "connect_timeout": 10,
+    "read_timeout": 120,
+}
+
+_session = None
+_session_settings = None
+_lock = threading.Lock()
+
+
+class JitterRetry(Retry):
+    """Retry with exponential backoff plus random jitter (Retry-After headers still take precedence)."""
+
+    def __init__(self, *args, jitter: float = 0.0, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.jitter = jitter
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.jitter = self.jitter
+        return retry
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return backoff
+        return backoff + random.uniform(0, self.jitter)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default (connect, read) timeout when none is given."""
+
+    def __init__(self, *args, timeout=None, **kwargs) -> None:
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def build_session(**settings) -> requests.Session:
+    """Creates a keep-alive session with pooled connections, gzip and retry/backoff."""
+
+    settings = {**DEFAULT_SESSION_SETTINGS, **settings}
+    retry = JitterRetry(
+        total=settings["total_retries"],
+        backoff_factor=settings["backoff_factor"],
+        status_forcelist=list(settings["status_forcelist"]),
+        allowed_methods=frozenset(settings["retry_methods"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+        jitter=settings["backoff_jitter"],
+    )
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=settings["pool_connections"],
+        pool_maxsize=settings["pool_maxsize"],
+        max_retries=retry,
+        timeout=(settings["connect_timeout"], settings["read_timeout"]),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
+
+
+def configure_session(settings=None) -> requests.Session:
+    """Replaces the shared session if settings (e.g., cfg.http_session) differ from the current ones."""
+
+    global _session, _session_settings
+    settings = dict(settings) if settings else {}
+    with _lock:
+        if _session is None or settings != _session_settings:
+            if _session is not None:
+                _session.close()
+            _session = build_session(**settings)
+            _session_settings = settings
+            utils_logger.info(
+                f"Configured shared HTTP session: {({**DEFAULT_SESSION_SETTINGS, **settings})}"
+            )
+    return _session
+
+
+def get_session() -> requests.Session:
+    """Returns the shared session, creating one with default settings if needed."""
+
+    if _session is None:
+        return configure_session(_session_settings)
+    return _session
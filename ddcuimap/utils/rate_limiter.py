@@ -0,0 +1,39 @@
+"""
+
+Thread-safe rate limiter for capping the number of API requests sent per second.
+
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """Models a simple token bucket that blocks callers so no more than `requests_per_second` requests are sent."""
+
+    def __init__(self, requests_per_second: float = 20, burst: int = 1) -> None:
+        if requests_per_second <= 0:
+            raise ValueError("requests_per_second must be greater than 0")
+        self.requests_per_second = requests_per_second
+        self.burst = max(int(burst), 1)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a request slot is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._last) * self.requests_per_second,
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.requests_per_second
+            time.sleep(wait)
+
+    __call__ = acquire
@@ -0,0 +1,130 @@
+"""
+
+Persistent key/value cache backed by SQLite for reusing API responses across runs.
+
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "ddcuimap"
+
+
+class SQLiteCache:
+    """Models a thread-safe on-disk cache of JSON-serializable values with TTL and size-based eviction."""
+
+    def __init__(
+        self, filepath, ttl_seconds: float = None, max_entries: int = None
+    ) -> None:
+        self.filepath = Path(filepath)
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # writes between evictions, so max_entries is enforced during a run as well
+        self.evict_every = max(1, min(1000, (max_entries or 0) // 10))
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.filepath), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed)"
+        )
+        self._conn.commit()
+        self.evict()
+
+    def get(self, key: str):
+        """Returns cached value for key or None if missing/expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._expired(row[1], now):
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value) -> None:
+        """Stores value for key, replacing any existing entry."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._conn.commit()
+        self._count_writes(1)
+
+    def set_many(self, items) -> None:
+        """Stores (key, value) pairs in a single transaction."""
+        items = list(items)
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                ((key, json.dumps(value), now, now) for key, value in items),
+            )
+            self._conn.commit()
+        self._count_writes(len(items))
+
+    def _count_writes(self, n: int) -> None:
+        """Evicts once evict_every writes have accumulated since the last eviction."""
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._writes += n
+            due = self._writes >= self.evict_every
+            if due:
+                self._writes = 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """Removes expired entries and least recently used entries beyond max_entries."""
+        removed = 0
+        with self._lock:
+            if self.ttl_seconds:
+                removed += self._conn.execute(
+                    "DELETE FROM cache WHERE created < ?",
+                    (time.time() - self.ttl_seconds,),
+                ).rowcount
+            if self.max_entries:
+                removed += self._conn.execute(
+                    "DELETE FROM cache WHERE key IN ("
+                    "SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+            self._conn.commit()
+        return removed
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and current number of entries."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self) -> None:
+        self.evict()
+        with self._lock:
+            self._conn.close()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created > self.ttl_seconds
+
+    def __len__(self) -> int:
+        return self.stats()["entries"]